@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+拼接 adb 命令的代码，指定 serial 时命令只发给对应的设备
+"""
+import os
+
+
+def adb_command(args, serial=None):
+    """
+    返回 adb 命令行，serial 为空时发给默认设备
+    """
+    if serial:
+        return 'adb -s {} {}'.format(serial, args)
+    return 'adb {}'.format(args)
+
+
+def list_devices():
+    """
+    返回所有已连接并授权的设备的 serial
+    """
+    serials = []
+    for line in os.popen(adb_command('devices')).read().splitlines()[1:]:
+        fields = line.split()
+        if len(fields) >= 2 and fields[1] == 'device':
+            serials.append(fields[0])
+    return serials
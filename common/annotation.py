@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+标注记录：打开 debug 时，每次备份截图都在同一目录的 annotations.jsonl 中
+追加一行，记录这一帧识别出的坐标、按压时间和这一跳是否落稳，
+作为离线评测（common/benchmark.py）和标定的数据
+
+    {"ts": 1515000000123, "device": "MI 5", "serial": "...", "rule": "auto",
+     "resolution": "1920x1080", "y_offset": 0, "piece_x": ..., "piece_y": ...,
+     "board_x": ..., "board_y": ..., "press_time": 640, "landed": true}
+
+只截取了识别需要的那一段时，备份的截图也只有这一段，y_offset 为它第一行
+在整个屏幕中的行号。rule 为记录它的脚本算坐标的规则，
+见 detector.RULES，评测时按同一规则比较
+
+ts 为这一跳的编号，见 next_id，也是备份截图的文件名；以前的记录中为秒级
+的时间戳，一秒内跳两次时会重复
+
+文件只追加，不修改已有的行。修正标注时追加一行只含 ts 和要修改的字段，
+并带有 "corrected": true，读取时同一 ts 的各行按顺序合并
+"""
+from __future__ import print_function
+import os
+import json
+import time
+import atexit
+import threading
+
+ANNOTATION_FILE = 'annotations.jsonl'
+
+# 可以修正的字段
+FIELDS = ('piece_x', 'piece_y', 'board_x', 'board_y', 'press_time', 'landed')
+
+_last_id = 0
+_id_lock = threading.Lock()
+
+
+def next_id():
+    """
+    返回一跳的编号：毫秒时间戳，与同一进程中上一个编号相同时加一，
+    所以一秒内跳几次也不会重复
+    """
+    global _last_id
+    with _id_lock:
+        _last_id = max(int(time.time() * 1000), _last_id + 1)
+        return _last_id
+
+
+def load_annotations(path):
+    """
+    返回 ts -> 合并后的标注，文件不存在时返回空字典
+    """
+    annotations = {}
+    if not os.path.isfile(path):
+        return annotations
+    with open(path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            ts = str(record['ts'])
+            annotations.setdefault(ts, {}).update(record)
+    return annotations
+
+
+def append(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def correct(path, ts, **fields):
+    """
+    追加一行对 ts 的修正，fields 为 FIELDS 中要修改的字段
+    """
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError('不能修正的字段: {}'.format(', '.join(sorted(unknown))))
+    record = dict(fields, ts=ts, corrected=True, corrected_at=int(time.time()))
+    append(path, record)
+    return record
+
+
+class AnnotationLog(object):
+    """
+    主循环中使用：add 记下这一跳，下一帧识别后用 landed 写入是否落稳；
+    directory 为截图备份的目录，device、serial 为写入每一行的设备信息，
+    rule 为脚本算坐标的规则；
+    程序退出时还没有结果的一跳按未知写入
+    """
+
+    def __init__(self, directory, device=None, serial=None, rule='auto'):
+        self.path = os.path.join(directory, ANNOTATION_FILE)
+        self.device = device
+        self.serial = serial
+        self.rule = rule
+        self.pending = None
+        self.written = 0
+        atexit.register(self.close)
+
+    def add(self, ts, frame, piece_x, piece_y, board_x, board_y, press_time):
+        """
+        记下这一跳，坐标为手机屏幕上的坐标；上一跳还没有结果时按未知写入
+        """
+        self.landed(None)
+        device_frame = frame.device_frame
+        w, h = device_frame.size
+        self.pending = {
+            'ts': ts,
+            'device': self.device,
+            'serial': self.serial,
+            'rule': self.rule,
+            'resolution': '{}x{}'.format(h, w),
+            'y_offset': device_frame.y_offset,
+            'piece_x': int(piece_x),
+            'piece_y': int(piece_y),
+            'board_x': int(board_x),
+            'board_y': int(board_y),
+            'press_time': int(press_time),
+        }
+
+    def landed(self, success):
+        """
+        写入上一跳的记录，success 为下一帧中是否还能找到棋子，
+        None 为不知道
+        """
+        if self.pending is None:
+            return
+        record, self.pending = self.pending, None
+        record['landed'] = success
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        append(self.path, record)
+        self.written += 1
+
+    def close(self):
+        self.landed(None)
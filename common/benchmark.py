@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+离线评测识别引擎：在一个截图目录（如 screenshot_backups/）上运行各个引擎，
+统计每个阶段的耗时、每秒帧数和与标注坐标的误差
+
+标注为目录中的 annotations.jsonl，见 common/annotation.py，ts 为截图的
+文件名（不含 .png）；坐标按标注中 rule 的脚本的规则，见 detector.RULES，
+没有 rule 的按 wechat_jump_auto.py 的规则；配置文件按标注中的 device 和
+截图的分辨率选择。
+只截取了一段的截图按标注中的 resolution 和 y_offset 还原它在屏幕中的位置
+"""
+from __future__ import print_function, division
+import os
+import glob
+import math
+import time
+import numpy as np
+from common import annotation, config, detector, screenshot
+
+# 计时的阶段，引擎中有同名方法时才计时，locate 为一帧的总耗时
+STAGES = ('find_scan_start_y', 'find_piece', 'find_board_top')
+
+PERCENTILES = (50, 95, 99)
+
+
+def list_frames(directory):
+    """
+    返回目录中的截图 [(ts, path)]，跳过加了注释的 *_d.png
+    """
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.png'))):
+        ts = os.path.splitext(os.path.basename(path))[0]
+        if not ts.endswith('_d'):
+            frames.append((ts, path))
+    return frames
+
+
+def load_frame(path, record=None):
+    """
+    读取截图，record 为它的标注
+    """
+    with open(path, 'rb') as f:
+        frame = screenshot.decode_png_screenshot(f.read())
+    if record and record.get('resolution'):
+        height, width = [int(v) for v in record['resolution'].split('x')]
+        frame.y_offset = record.get('y_offset', 0)
+        frame.size = (width, height)
+    return frame
+
+
+def summarize(samples):
+    """
+    返回 samples 的个数、平均值、最大值和 PERCENTILES 中的各个百分位数
+    """
+    summary = {'count': len(samples)}
+    if not samples:
+        return summary
+    summary['mean'] = round(float(np.mean(samples)), 3)
+    summary['max'] = round(float(np.max(samples)), 3)
+    for p in PERCENTILES:
+        summary['p{}'.format(p)] = round(float(np.percentile(samples, p)), 3)
+    return summary
+
+
+class StageTimer(object):
+    """
+    替换引擎实例上 STAGES 中的方法和 locate，记录每次调用的耗时（毫秒）
+    """
+
+    def __init__(self, engine):
+        self.samples = {}
+        for stage in STAGES + ('locate',):
+            if hasattr(engine, stage):
+                self.samples[stage] = []
+                setattr(engine, stage,
+                        self._wrap(getattr(engine, stage), self.samples[stage]))
+
+    @staticmethod
+    def _wrap(method, samples):
+        def timed(*args, **kwargs):
+            started = time.time()
+            result = method(*args, **kwargs)
+            samples.append((time.time() - started) * 1000)
+            return result
+        return timed
+
+
+class EngineRun(object):
+    """
+    一个引擎在整个目录上的评测，分辨率、机型或规则不同的截图各用一个引擎实例
+    """
+
+    def __init__(self, name, options):
+        self.name = name
+        self.options = options
+        self.engines = {}
+        self.timers = []
+        self.configs = {}
+        self.piece_errors = []
+        self.board_errors = []
+        self.misses = 0
+        self.error = None
+
+    def _engine(self, frame, model, rule):
+        w, h = frame.size
+        screen_size = '{}x{}'.format(h, w)
+        key = (screen_size, model, rule)
+        if key not in self.engines:
+            values = config.load_config(
+                config.match_config(screen_size, model), screen_size)
+            options = dict(detector.rule_options(rule, values), **self.options)
+            engine = detector.create_engine(self.name, values, **options)
+            self.timers.append(StageTimer(engine))
+            self.engines[key] = engine
+            self.configs[key] = values
+        return self.engines[key], self.configs[key]
+
+    def run(self, frame, annotation, repeat=1):
+        record = annotation or {}
+        rule = record.get('rule') or 'auto'
+        engine, values = self._engine(frame, record.get('device'), rule)
+        location = engine.locate(frame)
+        for _ in range(repeat - 1):
+            engine.locate(frame)
+        if annotation is None:
+            return
+        if location.piece_bottom is None:
+            self.misses += 1
+            return
+        piece_x, piece_y, board_x, board_y = detector.jump_points(
+            location, values, rule)
+        self.piece_errors.append(math.hypot(piece_x - annotation['piece_x'],
+                                            piece_y - annotation['piece_y']))
+        self.board_errors.append(math.hypot(board_x - annotation['board_x'],
+                                            board_y - annotation['board_y']))
+
+    def result(self):
+        if self.error is not None:
+            return {'engine': self.name, 'error': self.error}
+        latency = {}
+        for timer in self.timers:
+            for stage, samples in timer.samples.items():
+                latency.setdefault(stage, []).extend(samples)
+        total = latency.get('locate', [])
+        return {
+            'engine': self.name,
+            'frames': len(total),
+            'fps': round(len(total) * 1000 / sum(total), 2) if total else 0,
+            'latency_ms': dict((stage, summarize(samples))
+                               for stage, samples in latency.items()),
+            'error_px': {'piece': summarize(self.piece_errors),
+                         'board': summarize(self.board_errors)},
+            'misses': self.misses,
+        }
+
+
+def run(directory, engines=None, annotation_file=None, repeat=1, **options):
+    """
+    在 directory 中的每张截图上运行 engines（默认为所有注册的引擎），
+    每张截图计时 repeat 次，options 传给 create_engine；
+    返回可以直接写成 JSON 的结果
+    """
+    engines = engines or sorted(detector.ENGINES)
+    annotations = annotation.load_annotations(
+        annotation_file or os.path.join(directory, annotation.ANNOTATION_FILE))
+    frames = list_frames(directory)
+    runs = [EngineRun(name, options) for name in engines]
+    for ts, path in frames:
+        frame = load_frame(path, annotations.get(ts))
+        for engine_run in runs:
+            if engine_run.error is not None:
+                continue
+            try:
+                engine_run.run(frame, annotations.get(ts), repeat)
+            except (ImportError, IOError) as ex:
+                # 没有安装 opencv-python 或没有模板文件时跳过该引擎
+                engine_run.error = str(ex)
+        frame.close()
+    return {
+        'corpus': directory,
+        'frames': len(frames),
+        'annotated': sum(1 for ts, _ in frames if ts in annotations),
+        'repeat': repeat,
+        'engines': [engine_run.result() for engine_run in runs],
+    }
+
+
+def compare(results, baseline, latency_tolerance=0.2, error_tolerance=2.0):
+    """
+    与之前的结果 baseline 比较，返回退化的说明列表：
+    locate 的 p95 耗时增加超过 latency_tolerance（比例），
+    或坐标误差的 p95 增加超过 error_tolerance 像素
+    """
+    regressions = []
+    previous = dict((r['engine'], r) for r in baseline['engines']
+                    if 'error' not in r)
+    for current in results['engines']:
+        old = previous.get(current['engine'])
+        if old is None or 'error' in current:
+            continue
+        old_p95 = old['latency_ms'].get('locate', {}).get('p95')
+        new_p95 = current['latency_ms'].get('locate', {}).get('p95')
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + latency_tolerance):
+            regressions.append('{}: locate p95 {:.1f}ms -> {:.1f}ms'.format(
+                current['engine'], old_p95, new_p95))
+        for target in ('piece', 'board'):
+            old_error = old['error_px'][target].get('p95')
+            new_error = current['error_px'][target].get('p95')
+            if old_error is not None and new_error is not None \
+                    and new_error > old_error + error_tolerance:
+                regressions.append('{}: {} error p95 {:.1f}px -> {:.1f}px'
+                                   .format(current['engine'], target,
+                                           old_error, new_error))
+        if current['misses'] > old['misses']:
+            regressions.append('{}: misses {} -> {}'.format(
+                current['engine'], old['misses'], current['misses']))
+    return regressions
+
+
+def format_report(results):
+    """
+    返回便于阅读的结果表格
+    """
+    lines = ['{} 张截图，{} 张有标注'.format(results['frames'],
+                                         results['annotated'])]
+    for r in results['engines']:
+        if 'error' in r:
+            lines.append('{}: 跳过，{}'.format(r['engine'], r['error']))
+            continue
+        lines.append('{}: {} frames, {:.1f} fps, misses {}'.format(
+            r['engine'], r['frames'], r['fps'], r['misses']))
+        for stage in STAGES + ('locate',):
+            s = r['latency_ms'].get(stage)
+            if s and s['count']:
+                lines.append('  {:<20}p50 {:>7.2f}  p95 {:>7.2f}  '
+                             'p99 {:>7.2f} ms'.format(stage, s['p50'],
+                                                      s['p95'], s['p99']))
+        for target in ('piece', 'board'):
+            s = r['error_px'][target]
+            if s['count']:
+                lines.append('  {:<20}mean {:>6.1f}  p95 {:>6.1f}  '
+                             'max {:>6.1f} px'.format(target + ' error',
+                                                      s['mean'], s['p95'],
+                                                      s['max']))
+    return '\n'.join(lines)
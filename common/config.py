@@ -1,40 +1,260 @@
 # -*- coding: utf-8 -*-
 """
 调取配置文件和屏幕分辨率的代码
+
+config 文件夹中所有的配置文件编成索引，缓存在 config_index.json 中，
+配置文件有改动时自动重建。按以下顺序为设备选择配置：
+    1. 文件名与设备型号相同的配置，如 config/mi/mi6_config.json 对应 MI 6
+    2. 与屏幕大小相同的 config/{高}x{宽}/config.json
+    3. 宽高比最接近、宽度最接近的分辨率配置，像素参数按屏幕宽度换算
+所选配置中缺少的参数从 REFERENCE_SCREEN_SIZE 的配置中换算得到
 """
 import os
 import sys
 import json
 import re
+from common.adb import adb_command
+
+CONFIG_INDEX_FILE = 'config_index.json'
+# 索引格式变化时加一，旧的缓存会被重建
+CONFIG_INDEX_VERSION = 1
+
+# 参数最全的配置，其他配置缺少的参数从这里换算
+REFERENCE_SCREEN_SIZE = '2560x1440'
+# 以像素为单位的参数，从其他分辨率换算时按屏幕宽度等比缩放
+PIXEL_PARAMETERS = (
+    'under_game_score_y',
+    'piece_base_height_1_2',
+    'piece_body_width',
+    'piece_body_height_1_2',
+    'board_right_scan_height',
+    'piece_board_near_dx',
+)
+# 每台设备各自调节的参数，不从参考配置中补全
+DEVICE_PARAMETERS = ('press_coefficient', 'swipe')
+# iOS 设备的配置，只给 wechat_jump_auto_iOS.py 参考，不参与 Android 设备的匹配
+IOS_CONFIG_DIRS = ('iPhone',)
+# 型号名短于这个长度时只做完全匹配，避免 6、x、se 之类匹配到无关型号
+MODEL_MIN_PARTIAL_LENGTH = 3
+
+_index = None
+
+
+def open_accordant_config(serial=None):
+    """
+    调用配置文件，serial 为空时使用默认设备
+    """
+    screen_size = _get_screen_size(serial)
+    model = os.popen(
+        adb_command('shell getprop ro.product.model', serial)).read().strip()
+    return load_config(match_config(screen_size, model), screen_size)
+
+
+def normalize_model(model):
+    """
+    型号名只保留小写字母和数字，如 "MI NOTE 2" 和 note2_config 的 "note2"
+    """
+    return re.sub(r'[^0-9a-z]', '', model.lower())
+
+
+def _parse_size(screen_size):
+    height, width = screen_size.split('x')
+    return int(height), int(width)
+
+
+def _config_dir():
+    return os.path.join(sys.path[0], 'config')
+
+
+def _scan_config_dir(config_dir):
+    """
+    返回 config_dir 中所有 json 文件的 [(相对路径, 修改时间, 大小)]
+    """
+    files = []
+    for root, dirs, names in os.walk(config_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files.append([os.path.relpath(path, config_dir).replace('\\', '/'),
+                          stat.st_mtime, stat.st_size])
+    return files
+
+
+def build_config_index(config_dir, files):
+    """
+    读取所有配置文件，分辨率文件夹中的配置记录分辨率，
+    其他设备文件夹中的配置用去掉 _config 后缀的文件名作为型号
+    """
+    entries = []
+    for relpath, _, _ in files:
+        with open(os.path.join(config_dir, relpath), 'r') as f:
+            try:
+                values = json.load(f)
+            except ValueError:
+                print('无法解析配置文件 {}'.format(relpath))
+                continue
+        entry = {'path': relpath, 'config': values,
+                 'screen_size': None, 'model': None}
+        parts = relpath.split('/')
+        if len(parts) == 2 and re.match(r'^\d+x\d+$', parts[0]):
+            entry['screen_size'] = parts[0]
+        elif len(parts) == 2 and parts[0] not in IOS_CONFIG_DIRS:
+            entry['model'] = normalize_model(
+                re.sub(r'(_config)?\.json$', '', parts[1]))
+        entries.append(entry)
+    return entries
+
+
+def load_config_index(config_dir=None, cache_file=CONFIG_INDEX_FILE):
+    """
+    返回配置索引，配置文件没有变化时直接读取缓存
+    """
+    global _index
+    config_dir = config_dir or _config_dir()
+    files = _scan_config_dir(config_dir)
+    if _index is not None and _index['config_dir'] == config_dir \
+            and _index['files'] == files:
+        return _index
+    try:
+        with open(cache_file, 'r') as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        index = {}
+    if index.get('version') != CONFIG_INDEX_VERSION \
+            or index.get('config_dir') != config_dir \
+            or index.get('files') != files:
+        index = {'version': CONFIG_INDEX_VERSION, 'config_dir': config_dir,
+                 'files': files,
+                 'entries': build_config_index(config_dir, files)}
+        try:
+            with open(cache_file, 'w') as f:
+                json.dump(index, f, indent=2, sort_keys=True)
+        except (IOError, OSError):
+            pass
+    _index = index
+    return index
+
+
+def _find_entry(index, relpath):
+    for entry in index['entries']:
+        if entry['path'] == relpath:
+            return entry
+    return None
+
+
+def match_config(screen_size, model=None, index=None):
+    """
+    返回最适合设备的配置文件路径，选择顺序见模块说明
+    """
+    index = index or load_config_index()
+    config_dir = index['config_dir']
+    if model:
+        model = normalize_model(model)
+        matches = [entry for entry in index['entries'] if entry['model'] and (
+            entry['model'] == model
+            or len(entry['model']) >= MODEL_MIN_PARTIAL_LENGTH
+            and entry['model'] in model)]
+        if matches:
+            # mi5 和 mi5s 都能匹配 MI 5s 时选更长的
+            best = max(matches, key=lambda entry: len(entry['model']))
+            return os.path.join(config_dir, best['path'])
+    sized = [entry for entry in index['entries'] if entry['screen_size']]
+    if not sized:
+        return os.path.join(config_dir, 'default.json')
+    height, width = _parse_size(screen_size)
+
+    def distance(entry):
+        ref_height, ref_width = _parse_size(entry['screen_size'])
+        return (round(abs(ref_height / float(ref_width)
+                          - height / float(width)), 2),
+                abs(ref_width - width))
+
+    best = min(sized, key=distance)
+    return os.path.join(config_dir, best['path'])
 
 
-def open_accordant_config():
+def scale_config(values, from_width, to_width, from_height=None,
+                 to_height=None):
     """
-    调用配置文件
+    把配置中的像素参数从 from_width 宽的屏幕换算到 to_width 宽的屏幕，
+    swipe 的 y 坐标按高度换算
+    """
+    scaled = dict(values)
+    ratio = to_width / float(from_width)
+    for key in PIXEL_PARAMETERS:
+        if key in scaled:
+            scaled[key] = int(round(scaled[key] * ratio))
+    if 'swipe' in scaled and from_height and to_height:
+        y_ratio = to_height / float(from_height)
+        scaled['swipe'] = dict(
+            (key, int(round(value * (ratio if key[0] == 'x' else y_ratio))))
+            for key, value in scaled['swipe'].items())
+    return scaled
+
+
+def load_config(config_file, screen_size=None, canonical_width=None,
+                index=None):
     """
-    screen_size = _get_screen_size()
-    config_file = "{path}/config/{screen_size}/config.json".format(
-        path=sys.path[0],
-        screen_size=screen_size
-    )
-    if os.path.exists(config_file):
+    读取配置文件，指定 screen_size 时按屏幕大小换算像素参数，
+    并从参考配置中补全缺少的参数；指定 canonical_width 时像素参数再换算到
+    截图缩放后的宽度，swipe 仍是手机屏幕上的坐标
+    """
+    index = index or load_config_index()
+    relpath = os.path.relpath(
+        config_file, index['config_dir']).replace('\\', '/')
+    entry = _find_entry(index, relpath)
+    if entry is None:
         with open(config_file, 'r') as f:
-            print("Load config file from {}".format(config_file))
-            return json.load(f)
+            values = json.load(f)
+        entry = {'path': relpath, 'config': values,
+                 'screen_size': None, 'model': None}
+    if config_file.endswith('default.json'):
+        print("Load default config")
     else:
-        with open('{}/config/default.json'.format(sys.path[0]), 'r') as f:
-            print("Load default config")
-            return json.load(f)
+        print("Load config file from {}".format(config_file))
+    values = dict(entry['config'])
+    if screen_size is None:
+        return values
+    height, width = _parse_size(screen_size)
+    if entry['screen_size'] and entry['screen_size'] != screen_size:
+        ref_height, ref_width = _parse_size(entry['screen_size'])
+        print('按屏幕大小从 {} 换算为 {}'.format(entry['screen_size'],
+                                          screen_size))
+        values = scale_config(values, ref_width, width, ref_height, height)
+    reference = _find_entry(
+        index, '{}/config.json'.format(REFERENCE_SCREEN_SIZE))
+    if reference is not None:
+        ref_height, ref_width = _parse_size(REFERENCE_SCREEN_SIZE)
+        defaults = scale_config(reference['config'], ref_width, width)
+        for key, value in defaults.items():
+            if key not in values and key not in DEVICE_PARAMETERS:
+                values[key] = value
+    if canonical_width and canonical_width != width:
+        values = scale_config(values, width, canonical_width)
+        width = canonical_width
+    # 相对参考配置的缩放比例，脚本中其他按参考屏幕标定的像素值可以乘以它
+    values['scale'] = width / float(_parse_size(REFERENCE_SCREEN_SIZE)[1])
+    return values
 
 
-def _get_screen_size():
+def _get_screen_size(serial=None):
     """
     获取手机屏幕大小
     """
-    size_str = os.popen('adb shell wm size').read()
+    size_str = os.popen(adb_command('shell wm size', serial)).read()
     if not size_str:
         print('请安装 ADB 及驱动并配置环境变量')
         sys.exit()
+    return parse_screen_size(size_str)
+
+
+def parse_screen_size(size_str):
+    """
+    从 wm size 的输出中解析出 "高x宽"
+    """
     m = re.search(r'(\d+)x(\d+)', size_str)
     if m:
         return "{height}x{width}".format(height=m.group(2), width=m.group(1))
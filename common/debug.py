@@ -4,33 +4,47 @@
 """
 import os
 import sys
-import shutil
+import atexit
+import threading
+from six.moves import queue
 from PIL import ImageDraw
+from common import device
 
 screenshot_backup_dir = 'screenshot_backups/'
 
+# 后台保存队列满了之后的处理方式
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
 
 def make_debug_dir(screenshot_backup_dir):
     """
     创建备份文件夹
     """
     if not os.path.isdir(screenshot_backup_dir):
-        os.mkdir(screenshot_backup_dir)
+        try:
+            os.mkdir(screenshot_backup_dir)
+        except OSError:
+            # 多个后台线程可能同时创建
+            if not os.path.isdir(screenshot_backup_dir):
+                raise
 
 
-def backup_screenshot(ts):
+def backup_screenshot(ts, frame):
     """
     为了方便失败的时候 debug
     """
     make_debug_dir(screenshot_backup_dir)
-    shutil.copy('autojump.png', '{}{}.png'.format(screenshot_backup_dir, ts))
+    frame.save('{}{}.png'.format(screenshot_backup_dir, ts))
 
 
-def save_debug_screenshot(ts, im, piece_x, piece_y, board_x, board_y):
+def save_debug_screenshot(ts, frame, piece_x, piece_y, board_x, board_y):
     """
-    对 debug 图片加上详细的注释
+    对 debug 图片加上详细的注释，在截图的副本上绘制，不影响 frame 本身
     """
     make_debug_dir(screenshot_backup_dir)
+    im = frame.image.copy()
+    piece_y -= frame.y_offset
+    board_y -= frame.y_offset
     draw = ImageDraw.Draw(im)
     draw.line((piece_x, piece_y) + (board_x, board_y), fill=2, width=3)
     draw.line((piece_x, 0, piece_x, im.size[1]), fill=(255, 0, 0))
@@ -41,16 +55,127 @@ def save_debug_screenshot(ts, im, piece_x, piece_y, board_x, board_y):
     draw.ellipse((board_x - 10, board_y - 10, board_x + 10, board_y + 10), fill=(0, 0, 255))
     del draw
     im.save('{}{}_d.png'.format(screenshot_backup_dir, ts))
+    im.close()
+
+
+def archive_frame(ts, frame, piece_x, piece_y, board_x, board_y):
+    """
+    保存一帧的原图和加上注释的图，保存完后关闭 frame；
+    缩放识别时保存缩放前的原图，坐标为手机屏幕上的坐标
+    """
+    try:
+        device_frame = frame.device_frame
+        backup_screenshot(ts, device_frame)
+        save_debug_screenshot(ts, device_frame, piece_x, piece_y, board_x,
+                              board_y)
+    finally:
+        frame.close()
+
+
+def discard_frame(ts, frame, *args):
+    """
+    archive_frame 的任务被丢弃时调用，关闭 frame
+    """
+    frame.close()
+
+
+class DebugWriter(object):
+    """
+    在后台线程中保存 debug 截图，主循环只把任务放入有界队列，不等待 PNG 编码
+    和写盘；队列满时按 overflow 处理：drop_oldest 丢弃最早的任务，
+    drop_newest 丢弃新任务，block 等待队列空出位置；丢弃的任务不会执行，
+    on_drop 不为空时用同样的参数调用 on_drop(*args)，如关闭任务中的截图
+    程序退出时会等待队列中的任务写完，并输出丢弃的数量
+    """
+
+    def __init__(self, workers=1, max_pending=4, overflow='drop_oldest',
+                 on_drop=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('overflow 只能是 {}'.format(
+                ', '.join(OVERFLOW_POLICIES)))
+        self.overflow = overflow
+        self.on_drop = on_drop
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.close)
+
+    def submit(self, func, *args):
+        """
+        将 func(*args) 放入队列，返回是否放入成功
+        """
+        if self._closed:
+            self._drop(args)
+            return False
+        if self.overflow == 'block':
+            self._queue.put((func, args))
+            return True
+        while True:
+            try:
+                self._queue.put_nowait((func, args))
+                return True
+            except queue.Full:
+                if self.overflow == 'drop_newest':
+                    self._drop(args)
+                    return False
+            try:
+                _, dropped_args = self._queue.get_nowait()
+            except queue.Empty:
+                continue
+            self._queue.task_done()
+            self._drop(dropped_args)
+
+    def _drop(self, args):
+        with self._lock:
+            self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(*args)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                func, args = item
+                func(*args)
+                with self._lock:
+                    self.written += 1
+            except Exception as ex:
+                print('debug 截图保存失败: {}'.format(ex))
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """
+        等待队列中的任务全部完成后结束后台线程
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.join()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        print('debug 截图已保存 {} 张，丢弃 {} 张'.format(
+            self.written, self.dropped))
 
 
-def dump_device_info():
+def dump_device_info(serial=None, info=None):
     """
-    显示设备信息
+    显示设备信息，info 为缓存的设备信息，为空时同时执行各项查询
     """
-    size_str = os.popen('adb shell wm size').read()
-    device_str = os.popen('adb shell getprop ro.product.device').read()
-    phone_os_str = os.popen('adb shell getprop ro.build.version.release').read()
-    density_str = os.popen('adb shell wm density').read()
+    if info is None:
+        info = device.probe_device(serial)
     print("""**********
 Screen: {size}
 Density: {dpi}
@@ -59,10 +184,10 @@ Phone OS: {phone_os}
 Host OS: {host_os}
 Python: {python}
 **********""".format(
-        size=size_str.strip(),
-        dpi=density_str.strip(),
-        device=device_str.strip(),
-        phone_os=phone_os_str.strip(),
+        size=info['size'],
+        dpi=info['density'],
+        device=info['device'],
+        phone_os=info['phone_os'],
         host_os=sys.platform,
         python=sys.version
     ))
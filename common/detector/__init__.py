@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+识别棋子和新块的代码
+    scan        基于 NumPy 的扫描函数，以及背景模型、跨帧跟踪等
+    engine      识别引擎的共同接口 Engine、结果 Location 和引擎注册表
+    reference   逐像素 Python 循环的参考引擎
+    vectorized  NumPy 引擎
+    template    模板匹配引擎，需要 opencv-python
+    segment     连通域分割引擎，需要 opencv-python
+    ios         wechat_jump_auto_iOS.py 原来的扫描方式
+脚本用 create_engine(config['detector_engine'], config) 创建引擎
+"""
+from common.detector.scan import *
+from common.detector.engine import DEFAULT_ENGINE, ENGINES, Engine, \
+    Location, RULES, register_engine, create_engine, rule_options, \
+    jump_points
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+识别引擎的共同接口和注册表
+每个引擎都用 locate(frame) 从一帧中找出棋子和新块，返回 Location，
+各个脚本再按自己的规则算出棋子和目标点的坐标；换引擎只需修改配置文件中的
+detector_engine，不用改脚本
+"""
+from __future__ import division
+import time
+import math
+import importlib
+from common import timing
+from common.detector import scan
+
+DEFAULT_ENGINE = 'numpy'
+
+# 引擎名 -> (模块, 类名)，用到时才导入，template 和 segmentation 需要
+# opencv-python
+ENGINES = {
+    'reference': ('common.detector.reference', 'ReferenceEngine'),
+    'numpy': ('common.detector.vectorized', 'NumpyEngine'),
+    'template': ('common.detector.template', 'TemplateEngine'),
+    'segmentation': ('common.detector.segment', 'SegmentationEngine'),
+    'ios': ('common.detector.ios', 'IosEngine'),
+}
+
+
+def register_engine(name, module, class_name):
+    """
+    注册一个引擎，module 中的 class_name 应为 Engine 的子类
+    """
+    ENGINES[name] = (module, class_name)
+
+
+def create_engine(name, config, **options):
+    """
+    创建名为 name 的引擎，name 为空时使用 DEFAULT_ENGINE；
+    options 中引擎用不到的选项会被忽略
+    """
+    name = name or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError('没有名为 {} 的识别引擎，可用的引擎: {}'.format(
+            name, ', '.join(sorted(ENGINES))))
+    module, class_name = ENGINES[name]
+    engine_class = getattr(importlib.import_module(module), class_name)
+    return engine_class(config, **options)
+
+
+def _auto_points(location, config):
+    # wechat_jump_auto.py：棋子最低一行往上移棋子底座高度的一半，
+    # 新块和棋子太近时不使用右顶点
+    piece_x = piece_y = board_x = board_y = 0
+    if location.piece_bottom is not None:
+        piece_x = int(location.piece_bottom[0])
+        piece_y = location.piece_bottom[1] - config['piece_body_height_1_2']
+    if location.board_top is not None:
+        board_x = int(location.board_top[0])
+    if abs(board_x - piece_x) < config['piece_board_near_dx']:
+        board_y = piece_y
+    elif location.board_right_y is not None:
+        board_y = location.board_right_y
+    return piece_x, piece_y, board_x, board_y
+
+
+def _pro_points(location, config):
+    # wechat_jump_auto_pro.py：棋子的 Y 坐标就是最低一行，新块和棋子的水平
+    # 距离小于 300（按 1440 宽的屏幕）时按角度推算，否则取右顶点
+    piece_x = piece_y = board_x = board_y = 0
+    if location.piece_bottom is not None:
+        piece_x = int(location.piece_bottom[0])
+        piece_y = location.piece_bottom[1]
+    if location.board_top is not None:
+        board_x = int(location.board_top[0])
+    if abs(board_x - piece_x) < int(round(300 * config['scale'])):
+        board_y = piece_y - abs((board_x - piece_x) * config['tanA'])
+    elif location.board_right_y is not None:
+        board_y = location.board_right_y
+    return piece_x, piece_y, board_x, board_y
+
+
+def _easy_points(location, config):
+    # wechat_jump_auto_easy.py：新块取顶点，找到右顶点时 Y 坐标取右顶点的
+    piece_x = piece_y = board_x = board_y = 0
+    if location.piece_bottom is not None:
+        piece_x = int(location.piece_bottom[0])
+        piece_y = location.piece_bottom[1] - config['piece_body_height_1_2']
+    if location.board_top is not None:
+        board_x = int(location.board_top[0])
+        board_y = location.board_top[1]
+    if location.board_right_y is not None:
+        board_y = location.board_right_y
+    return piece_x, piece_y, board_x, board_y
+
+
+def _ios_points(location, config):
+    # wechat_jump_auto_iOS.py：棋子往上移棋子底盘高度的一半，新块的 Y 坐标
+    # 按 30° 从棋子推算；任一个找不到时都为 0。ios 引擎的棋子 x 为所有棋子
+    # 颜色的点的平均值，其他引擎为最低一行的平均值
+    if location.piece_bottom is None or location.board_top is None:
+        return 0, 0, 0, 0
+    piece_x, piece_y_max = location.piece_bottom
+    piece_y = piece_y_max - config['piece_base_height_1_2']
+    board_x = location.board_top[0]
+    board_y = piece_y - abs(board_x - piece_x) * math.sqrt(3) / 3
+    if not all((board_x, board_y)):
+        return 0, 0, 0, 0
+    return piece_x, piece_y, board_x, board_y
+
+
+# 规则名 -> 按这个脚本的规则算坐标的函数，规则名写在标注的 rule 中
+RULES = {
+    'auto': _auto_points,
+    'pro': _pro_points,
+    'easy': _easy_points,
+    'iOS': _ios_points,
+}
+
+
+def rule_options(rule, config):
+    """
+    按 rule 的脚本创建引擎时的参数：pro 的新块扫描到棋子最低一行为止，
+    iOS 的扫描到棋子底盘高度的一半为止
+    """
+    if rule == 'pro':
+        return {'board_margin': 0}
+    if rule == 'iOS':
+        return {'board_margin': config['piece_base_height_1_2']}
+    return {}
+
+
+def jump_points(location, config, rule='auto'):
+    """
+    按 rule（见 RULES）的脚本的规则从 location 算出
+    (piece_x, piece_y, board_x, board_y)，找不到的坐标为 0
+    """
+    return RULES[rule](location, config)
+
+
+class Location(object):
+    """
+    一帧的识别结果，行号都是整张截图中的行号，找不到时为 None
+        scan_start_y    探测到的扫描起始行
+        piece_bottom    棋子最低一行 (该行所有点的平均 x, 行号)
+        board_top       新块顶点 (最上面一行所有点的平均 x, 行号)
+        board_right_y   新块右顶点的行号
+    分割引擎还会给出 piece_centroid 和 board_centroid
+    """
+
+    def __init__(self, scan_start_y=0):
+        self.scan_start_y = scan_start_y
+        self.piece_bottom = None
+        self.board_top = None
+        self.board_right_y = None
+        self.piece_centroid = None
+        self.board_centroid = None
+
+
+class Engine(object):
+    """
+    引擎的基类，子类实现 _locate。各引擎找的区域相同：
+        scan_start_y  [h / 3, h * 2 / 3) 中每隔 20 行取样，第一行不是纯色的
+                      行往上 20 行
+        棋子          [scan_start_y + 1, h * 2 / 3] 行，左右各去掉 w / 8
+        新块顶点      棋子的另一侧，[scan_start_y, 棋子最低一行 - board_margin)
+        新块右顶点    从顶点那一列往右，顶点以下 board_right_scan_height 行
+    board_margin 为空时为配置中的 piece_body_height_1_2；配置中没有
+    board_right_scan_height 时不找右顶点。rules 为 scan.ColorRules，为空时
+    使用 use_config 设置的规则
+    """
+    name = None
+
+    def __init__(self, config, rules=None, board_margin=None, **options):
+        # options 为其他引擎的选项
+        self.rules = rules or scan.current_rules()
+        self.piece_body_width = config['piece_body_width']
+        if board_margin is None:
+            board_margin = config['piece_body_height_1_2']
+        self.board_margin = board_margin
+        self.right_scan_height = config.get('board_right_scan_height')
+        self.scale = config.get('scale', 1.0)
+        self.scan_start_probe = scan.ScanStartProbe()
+        self.background = scan.BackgroundModel()
+        self.frames = 0
+        self.elapsed = 0.0
+        self.slowest = 0.0
+
+    def locate(self, frame):
+        """
+        返回 frame 中的 Location，并记录耗时
+        """
+        started = time.time()
+        with timing.span('locate'):
+            location = self._locate(frame)
+        elapsed = time.time() - started
+        self.frames += 1
+        self.elapsed += elapsed
+        self.slowest = max(self.slowest, elapsed)
+        return location
+
+    def _locate(self, frame):
+        raise NotImplementedError
+
+    def expect(self, x, row):
+        """
+        跳之前告诉引擎下一帧棋子最低一行预计落到 (x, row)，
+        不跨帧跟踪的引擎不使用
+        """
+
+    def find_scan_start_y(self, frame):
+        """
+        更新这一帧的背景模型并探测 scan_start_y
+        """
+        w, h = frame.size
+        with timing.span('scan_start'):
+            background = self.background.update(frame.array, frame.y_offset)
+            changed_row = self.scan_start_probe.find(
+                frame.array, int(h / 3), int(h * 2 / 3), 20, frame.y_offset,
+                background)
+        if changed_row is None:
+            return 0
+        return changed_row - 20
+
+    def board_columns(self, piece_x, w):
+        """
+        新块顶点的扫描列 [start, end)，如果棋子在左侧则扫描棋子右侧，
+        反之相反
+        """
+        if piece_x < w / 2:
+            return int(piece_x + self.piece_body_width / 2), w - 1
+        return 0, int(piece_x - self.piece_body_width / 2)
+
+    def report(self):
+        return '{}: {} frames, {:.1f}ms/frame, slowest {:.1f}ms'.format(
+            self.name, self.frames,
+            self.elapsed * 1000 / max(self.frames, 1), self.slowest * 1000)
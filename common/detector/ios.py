@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+iOS 引擎：wechat_jump_auto_iOS.py 原来的扫描方式，找的区域与 Engine 的说明
+不同：
+    scan_start_y  从 under_game_score_y 开始每隔 50 行取样，第一行不是纯色的
+                  行往上 50 行
+    棋子          [scan_start_y, h * 2 / 3) 行，左右各去掉 w / 8，所有棋子
+                  颜色的点的平均 x 和最大行号
+    新块顶点      [h / 3, h * 2 / 3) 行，逐行与该行背景（第 0 列）比较，
+                  与棋子的水平距离小于 piece_body_width 的列不参与判断
+piece_bottom 为 (所有棋子颜色的点的平均 x, 最大行号)，不找右顶点
+"""
+from __future__ import division
+import numpy as np
+from common import timing
+from common.detector import scan
+from common.detector.engine import Engine, Location
+
+
+class IosEngine(Engine):
+    name = 'ios'
+
+    def __init__(self, config, **options):
+        super(IosEngine, self).__init__(config, **options)
+        self.under_game_score_y = config['under_game_score_y']
+
+    def _locate(self, frame):
+        w, h = frame.size
+        im_array, y_offset = frame.array, frame.y_offset
+        location = Location()
+        with timing.span('scan_start'):
+            background = self.background.update(im_array, y_offset)
+            changed_row = self.scan_start_probe.find(
+                im_array, self.under_game_score_y, h, 50, y_offset,
+                background)
+        if changed_row is not None:
+            location.scan_start_y = changed_row - 50
+
+        scan_x_border = int(w / 8)
+        with timing.span('piece'):
+            location.piece_bottom = scan.find_piece_centroid(
+                im_array, scan_x_border, w - scan_x_border,
+                location.scan_start_y, int(h * 2 / 3), y_offset, self.rules)
+        if location.piece_bottom is None:
+            return location
+
+        # 修掉脑袋比下一个小格子还高的情况的 bug，棋子附近的列不参与判断
+        skip_columns = np.abs(np.arange(w) - location.piece_bottom[0]) \
+            < self.piece_body_width
+        with timing.span('board'):
+            location.board_top = scan.find_board_top_by_background(
+                im_array, int(h / 3), int(h * 2 / 3), skip_columns, y_offset,
+                self.rules.threshold, background=background)
+        return location
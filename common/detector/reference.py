@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+参考引擎：与最初的脚本一样逐个像素用 Python 循环扫描，很慢，
+只用来核对其他引擎的结果
+"""
+from __future__ import division
+from common.detector.engine import Engine, Location
+
+
+class ReferenceEngine(Engine):
+    name = 'reference'
+
+    def _locate(self, frame):
+        w, h = frame.size
+        pixels = frame.image.load()
+        y_offset = frame.y_offset
+        y_end = y_offset + frame.array.shape[0]
+
+        def pixel(x, y):
+            # y 为整张截图中的行号
+            return pixels[x, y - y_offset]
+
+        def differs(a, b):
+            return abs(a[0] - b[0]) + abs(a[1] - b[1]) + abs(a[2] - b[2]) \
+                > self.rules.threshold
+
+        location = Location()
+        for i in range(int(h / 3), int(h * 2 / 3), 20):
+            if not y_offset <= i < y_end:
+                continue
+            background = pixel(0, i)
+            if any(pixel(j, i) != background for j in range(1, w)):
+                location.scan_start_y = i - 20
+                break
+        scan_start_y = location.scan_start_y
+
+        (r_min, r_max), (g_min, g_max), (b_min, b_max) = \
+            self.rules.piece_color_range
+        scan_start_x = int(w / 8)
+        for i in range(min(int(h * 2 / 3), y_end - 1), scan_start_y, -1):
+            if i < y_offset:
+                break
+            xs = [j for j in range(scan_start_x, w - scan_start_x)
+                  if r_min < pixel(j, i)[0] < r_max
+                  and g_min < pixel(j, i)[1] < g_max
+                  and b_min < pixel(j, i)[2] < b_max]
+            if xs:
+                location.piece_bottom = sum(xs) / len(xs), i
+                break
+        if location.piece_bottom is None:
+            return location
+
+        piece_x, piece_row = location.piece_bottom
+        x_start, x_end = self.board_columns(int(piece_x), w)
+        # 截取的一段中，第一行没有上一行可以比较
+        first = max(scan_start_y, y_offset + 1) if y_offset else scan_start_y
+        for i in range(first, min(piece_row - self.board_margin, y_end)):
+            xs = [j for j in range(x_start, x_end)
+                  if differs(pixel(j, i), pixel(j, i - 1))]
+            if xs:
+                location.board_top = sum(xs) / len(xs), i
+                break
+        if location.board_top is None or not self.right_scan_height:
+            return location
+
+        # 从顶点那一列往右，每列找第一个与该行第 0 列色差大的点，
+        # 直到某一列找不到为止
+        board_y_top = location.board_top[1]
+        rows = range(max(board_y_top, y_offset),
+                     min(board_y_top + self.right_scan_height, y_end))
+        for i in range(int(location.board_top[0]), w):
+            found = None
+            for j in rows:
+                if differs(pixel(i, j), pixel(0, j)):
+                    found = j
+                    break
+            if found is None:
+                break
+            location.board_right_y = found
+        return location
@@ -0,0 +1,717 @@
+# -*- coding: utf-8 -*-
+"""
+基于 NumPy 的识别代码，替代逐像素的 Python 循环，结果与原有的扫描方式一致
+参数和返回值中的行号都是整张截图中的行号，im_array 只是截图中从第 y_offset
+行开始的一段时，需要传入 y_offset
+"""
+from __future__ import division
+import time
+from functools import partial
+import numpy as np
+
+
+# 棋子最低一行的颜色区间（开区间），依次为 R G B，
+# 配置文件中的 piece_color_range 可以覆盖
+PIECE_COLOR_RANGE = ((50, 60), (53, 63), (95, 110))
+# 判断棋盘边缘时，RGB 三个通道差的绝对值之和大于此值即认为颜色不同，
+# 配置文件中的 board_diff_threshold 可以覆盖
+BOARD_DIFF_THRESHOLD = 10
+# 金字塔搜索的缩小倍数，在每隔 4 行、4 列取样的缩小图上找大致位置
+PYRAMID_FACTOR = 4
+# 跟踪棋子的窗口为预计位置左右、上下各多少像素，按 1440 宽的屏幕
+TRACK_HALF_WIDTH = 200
+TRACK_HALF_HEIGHT = 300
+# 增量分析时与上一帧比较的格子大小
+INCREMENTAL_TILE = 32
+
+
+def image_to_array(im):
+    """
+    将 PIL 图片转换为 (h, w, c) 的 uint8 数组，只保留 RGB 三个通道
+    """
+    im_array = np.asarray(im)
+    if im_array.ndim == 2:
+        raise ValueError('不支持的图片模式: {}'.format(im.mode))
+    return im_array[:, :, :3]
+
+
+def _span(start, end, offset=0):
+    """
+    与 range(start, end) 一致的切片边界，避免负数下标被当成倒数，
+    offset 为数组第一行在截图中的行号
+    """
+    start = max(int(start) - offset, 0)
+    end = max(int(end) - offset, start)
+    return start, end
+
+
+class ColorRules(object):
+    """
+    编译好的颜色判断规则：棋子颜色编译成以 24 位 RGB 为下标的查找表，
+    RGBA 的截图每个像素取一次值即可判断；threshold 为判断棋盘边缘的色差阈值
+    """
+
+    def __init__(self, piece_color_range=PIECE_COLOR_RANGE,
+                 threshold=BOARD_DIFF_THRESHOLD):
+        self.piece_color_range = tuple(
+            (int(low), int(high)) for low, high in piece_color_range)
+        self.threshold = threshold
+        values = np.arange(256)
+        r, g, b = np.ix_(*[np.flatnonzero((values > low) & (values < high))
+                           for low, high in self.piece_color_range])
+        # 下标为 B << 16 | G << 8 | R，即 RGBA 像素看作 uint32 后的低 24 位
+        self.piece_lut = np.zeros(1 << 24, bool)
+        self.piece_lut[(b << 16) | (g << 8) | r] = True
+
+    def piece_mask(self, region):
+        """
+        对一块区域做棋子颜色判断，返回同样大小的布尔数组
+        """
+        if region.shape[2] == 4 and region.strides[2] == 1 \
+                and region.strides[1] == 4:
+            return np.take(self.piece_lut, _as_uint32(region) & 0xffffff)
+        # RGB 的截图拼出 24 位下标比直接比较还慢
+        (r_min, r_max), (g_min, g_max), (b_min, b_max) = \
+            self.piece_color_range
+        r = region[:, :, 0]
+        g = region[:, :, 1]
+        b = region[:, :, 2]
+        return (r > r_min) & (r < r_max) \
+            & (g > g_min) & (g < g_max) \
+            & (b > b_min) & (b < b_max)
+
+
+# 同样的规则只编译一次，多台设备的配置相同时共用
+_compiled_rules = {}
+_rules = None
+
+
+def compile_rules(values):
+    """
+    从配置中编译颜色判断规则，配置中没有的使用默认值
+    """
+    key = (tuple(tuple(bounds) for bounds in values.get(
+        'piece_color_range', PIECE_COLOR_RANGE)),
+        values.get('board_diff_threshold', BOARD_DIFF_THRESHOLD))
+    if key not in _compiled_rules:
+        _compiled_rules[key] = ColorRules(*key)
+    return _compiled_rules[key]
+
+
+def use_config(values):
+    """
+    启动时调用，之后没有指定规则的识别都使用这份配置中的颜色判断规则
+    """
+    global _rules
+    _rules = compile_rules(values)
+    return _rules
+
+
+def current_rules():
+    global _rules
+    if _rules is None:
+        _rules = compile_rules({})
+    return _rules
+
+
+def _threshold(threshold):
+    return current_rules().threshold if threshold is None else threshold
+
+
+def piece_mask(region, rules=None):
+    """
+    对一块区域做棋子颜色判断，返回同样大小的布尔数组，
+    rules 为空时使用 use_config 设置的规则
+    """
+    return (rules or current_rules()).piece_mask(region)
+
+
+def find_piece_bottom(im_array, x_start, x_end, y_start, y_end, y_offset=0,
+                      rules=None):
+    """
+    在 [y_start, y_end) 行、[x_start, x_end) 列中找最下面一行棋子颜色的点，
+    返回 (该行所有点的平均 x, 行号)，找不到时返回 None
+    """
+    x_start, x_end = _span(x_start, x_end)
+    y_start, y_end = _span(y_start, y_end, y_offset)
+    mask = piece_mask(im_array[y_start:y_end, x_start:x_end], rules)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    row = rows[-1]
+    xs = np.flatnonzero(mask[row])
+    return (int(xs.sum()) + x_start * len(xs)) / len(xs), \
+        y_offset + y_start + int(row)
+
+
+def find_piece_centroid(im_array, x_start, x_end, y_start, y_end,
+                        y_offset=0, rules=None):
+    """
+    在区域中找所有棋子颜色的点，返回 (所有点的平均 x, 最大行号)，
+    找不到时返回 None
+    """
+    x_start, x_end = _span(x_start, x_end)
+    y_start, y_end = _span(y_start, y_end, y_offset)
+    mask = piece_mask(im_array[y_start:y_end, x_start:x_end], rules)
+    ys, xs = np.nonzero(mask)
+    if not len(xs):
+        return None
+    return (int(xs.sum()) + x_start * len(xs)) / len(xs), \
+        y_offset + y_start + int(ys.max())
+
+
+def _l1_distance(a, b):
+    """
+    两组像素 RGB 三个通道差的绝对值之和
+    """
+    return np.abs(a[..., :3].astype(np.int16)
+                  - b[..., :3].astype(np.int16)).sum(axis=-1)
+
+
+def find_board_top(im_array, x_start, x_end, y_start, y_end, y_offset=0,
+                   threshold=None, chunk=64):
+    """
+    从 y_start 行开始往下，逐行与上一行比较，找到第一行色差大于 threshold
+    的点，返回 (这一行所有点的平均 x, 行号)，找不到时返回 None
+    按 chunk 行分块计算，找到后就不再计算剩下的行；
+    threshold 为空时使用 use_config 设置的阈值
+    """
+    threshold = _threshold(threshold)
+    x_start, x_end = _span(x_start, x_end)
+    y_start, y_end = int(y_start) - y_offset, int(y_end) - y_offset
+    if y_offset:
+        # 截取的一段中，第一行没有上一行可以比较
+        y_start = max(y_start, 1)
+    for top in range(y_start, y_end, chunk):
+        bottom = min(top + chunk, y_end)
+        # 用下标数组取行，y_start 为 0 时上一行与原来一样取到最后一行
+        block = im_array[np.arange(top - 1, bottom), x_start:x_end]
+        hit = _l1_distance(block[1:], block[:-1]) > threshold
+        rows = np.flatnonzero(hit.any(axis=1))
+        if len(rows):
+            row = rows[0]
+            xs = np.flatnonzero(hit[row])
+            return (int(xs.sum()) + x_start * len(xs)) / len(xs), \
+                y_offset + top + int(row)
+    return None
+
+
+def find_board_right_y(im_array, x_start, y_start, y_end, y_offset=0,
+                       threshold=None, background=None):
+    """
+    从 x_start 列开始往右逐列扫描，每列在 [y_start, y_end) 行中找第一个与
+    该行背景（第 0 列）色差大于 threshold 的点，直到某一列找不到为止，
+    返回最后一列找到的 y，第一列就找不到时返回 None；
+    background 为这一帧的 BackgroundModel，不用再读取第 0 列
+    """
+    threshold = _threshold(threshold)
+    x_start = max(int(x_start), 0)
+    y_start, y_end = _span(y_start, y_end, y_offset)
+    block = im_array[y_start:y_end, x_start:]
+    hit = _foreground(block, y_start, y_end, threshold, background,
+                      im_array)
+    misses = np.flatnonzero(~hit.any(axis=0))
+    run = misses[0] if len(misses) else hit.shape[1]
+    if not run:
+        return None
+    return y_offset + y_start + int(hit[:, run - 1].argmax())
+
+
+def find_board_top_by_background(im_array, y_start, y_end, skip_columns=None,
+                                 y_offset=0, threshold=None, chunk=64,
+                                 background=None):
+    """
+    从 y_start 行开始往下，逐行与该行背景（第 0 列）比较，找到第一行色差
+    大于 threshold 的点，skip_columns 为 True 的列不参与判断，
+    返回 (这一行所有点的平均 x, 行号)，找不到时返回 None；
+    background 为这一帧的 BackgroundModel，已知是纯色的行不再比较
+    """
+    threshold = _threshold(threshold)
+    y_start, y_end = _span(y_start, y_end, y_offset)
+    for top in range(y_start, y_end, chunk):
+        bottom = min(top + chunk, y_end)
+        if background is not None and background.all_plain(top, bottom):
+            continue
+        block = im_array[top:bottom]
+        hit = _foreground(block, top, bottom, threshold, background,
+                          im_array)
+        if skip_columns is not None:
+            hit &= ~skip_columns
+        rows = np.flatnonzero(hit.any(axis=1))
+        if len(rows):
+            row = rows[0]
+            xs = np.flatnonzero(hit[row])
+            return int(xs.sum()) / len(xs), y_offset + top + int(row)
+    return None
+
+
+def find_piece_bottom_pyramid(im_array, x_start, x_end, y_start, y_end,
+                              y_offset=0, factor=PYRAMID_FACTOR, rules=None):
+    """
+    先在每隔 factor 行、factor 列取样的缩小图上找最下面一行有棋子颜色的
+    取样行，再对它和下方共 2 * factor 行原分辨率的行调用 find_piece_bottom。
+    棋子最低一行在这些行中时结果与全图扫描相同，只有棋子被遮挡得比 factor
+    还窄时才可能找到更靠上的行
+    """
+    x_start, x_end = _span(x_start, x_end)
+    top, bottom = _span(y_start, y_end, y_offset)
+    mask = piece_mask(im_array[top:bottom:factor, x_start:x_end:factor],
+                      rules)
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return None
+    window_top = top + int(rows[-1]) * factor
+    return find_piece_bottom(
+        im_array, x_start, x_end, y_offset + window_top,
+        y_offset + min(window_top + 2 * factor, bottom), y_offset, rules)
+
+
+def find_board_top_pyramid(im_array, x_start, x_end, y_start, y_end,
+                           y_offset=0, threshold=None, factor=PYRAMID_FACTOR):
+    """
+    先在缩小图上逐行与上一个取样行比较，找到第一行有色差的取样行，再对它
+    和上方共 2 * factor + 1 行原分辨率的行调用 find_board_top，这些行中
+    找不到时从下方继续全图扫描。缩小图每 factor 列只取一列，新块顶点比
+    factor 窄时可能晚几个取样行才发现：顶点在这个窗口内时结果与全图扫描
+    相同；顶点在 2 * factor 行内都只落在跳过的列中（如细的尖角）时窗口
+    在顶点下方，找到的是更靠下的一行，与全图扫描不同。PyramidSearch 的
+    verify 会记录这种坐标差
+    """
+    threshold = _threshold(threshold)
+    x_start, x_end = _span(x_start, x_end)
+    top, bottom = _span(y_start, y_end, y_offset)
+    level = im_array[top:bottom:factor, x_start:x_end:factor]
+    hit = _l1_distance(level[1:], level[:-1]) > threshold
+    rows = np.flatnonzero(hit.any(axis=1))
+    if not len(rows):
+        return None
+    # 第一个有色差的取样行，它与上一个取样行之间的某一行是新块顶点
+    changed = top + (int(rows[0]) + 1) * factor
+    window_bottom = min(changed + 1, bottom)
+    result = find_board_top(
+        im_array, x_start, x_end, y_offset + max(changed - 2 * factor, top),
+        y_offset + window_bottom, y_offset, threshold)
+    if result is None:
+        result = find_board_top(
+            im_array, x_start, x_end, y_offset + window_bottom,
+            y_offset + bottom, y_offset, threshold)
+    return result
+
+
+def _coordinate_error(result, expected):
+    """
+    两次查找结果的坐标差，一次找到、一次找不到时为无穷大
+    """
+    if result is None or expected is None:
+        return 0 if result is expected else float('inf')
+    return max(abs(result[0] - expected[0]), abs(result[1] - expected[1]))
+
+
+class PyramidSearch(object):
+    """
+    用金字塔搜索查找棋子和新块顶点，factor 为 None 时直接全图扫描；
+    incremental 为 True 时新块顶点用 IncrementalBoardScan 查找（factor
+    不为 None 时仍用金字塔搜索）；verify 为 True 时每次同时做一次全图扫描，
+    记录两种方式的耗时和坐标差；rules 为空时使用 use_config 设置的规则
+    """
+
+    def __init__(self, factor=PYRAMID_FACTOR, verify=False,
+                 incremental=False, rules=None):
+        self.factor = factor
+        self.verify = verify
+        self.rules = rules
+        threshold = rules.threshold if rules is not None else None
+        self.board_scan = IncrementalBoardScan(threshold=threshold) \
+            if incremental else None
+        # 阶段名 -> (金字塔搜索耗时, 全图扫描耗时)，单位秒
+        self.timings = {}
+        # 阶段名 -> 与全图扫描的坐标差
+        self.errors = {}
+
+    def _run(self, stage, fast, full, *args):
+        if fast is None:
+            return full(*args)
+        start = time.time()
+        result = fast(*args)
+        elapsed = time.time() - start
+        full_elapsed = None
+        if self.verify:
+            start = time.time()
+            expected = full(*args)
+            full_elapsed = time.time() - start
+            self.errors[stage] = _coordinate_error(result, expected)
+        self.timings[stage] = (elapsed, full_elapsed)
+        return result
+
+    def find_piece_bottom(self, *args):
+        fast = None
+        if self.factor:
+            fast = partial(find_piece_bottom_pyramid, factor=self.factor,
+                           rules=self.rules)
+        return self._run('piece', fast,
+                         partial(find_piece_bottom, rules=self.rules), *args)
+
+    def find_board_top(self, *args):
+        threshold = _threshold(
+            self.rules.threshold if self.rules is not None else None)
+        fast = None
+        if self.factor:
+            fast = partial(find_board_top_pyramid, threshold=threshold,
+                           factor=self.factor)
+        elif self.board_scan is not None:
+            fast = partial(self.board_scan.find_board_top,
+                           threshold=threshold)
+        return self._run('board', fast,
+                         partial(find_board_top, threshold=threshold), *args)
+
+    def report(self):
+        """
+        最近一次各阶段的耗时和坐标差
+        """
+        parts = []
+        for stage in sorted(self.timings):
+            elapsed, full_elapsed = self.timings[stage]
+            part = '{}: {:.2f}ms'.format(stage, elapsed * 1000)
+            if full_elapsed is not None:
+                part += ' (full {:.2f}ms, error {}px)'.format(
+                    full_elapsed * 1000, self.errors[stage])
+            parts.append(part)
+        if self.board_scan is not None:
+            parts.append(self.board_scan.report())
+        return ', '.join(parts)
+
+
+def _as_uint32(block):
+    """
+    把 (h, w, 4) 的 uint8 数组看作 (h, w) 的 uint32，不复制
+    """
+    return block.view(np.uint32)[..., 0]
+
+
+class IncrementalBoardScan(object):
+    """
+    增量分析：相邻两帧中背景、当前块基本不变，find_board_top 逐行与上一行
+    比较的结果按 tile 行、tile 列分成格子缓存下来。下一帧只有像素与上一帧
+    不完全相同（或上一行有变化）的格子才重新计算，没变化的格子沿用缓存，
+    结果与 find_board_top 完全相同。每个格子的缓存带着计算时用到的像素，
+    所以只扫描到一部分行时，其余行的缓存仍然有效
+    """
+
+    def __init__(self, tile=INCREMENTAL_TILE, threshold=None):
+        self.tile = tile
+        self.threshold = threshold
+        self._layout = None
+        # tile 行号 -> [这几行和上一行的像素, 逐行色差结果, 每列格子是否已计算]
+        self._bands = {}
+        self.reused_tiles = 0
+        self.scanned_tiles = 0
+
+    def _band(self, im_array, y_offset, band, first, last):
+        """
+        返回 (第 band 个 tile 行在 im_array 中的第一行, 缓存)，[first, last)
+        列中与上一帧相比有变化的格子标记为未计算，这一行不在 im_array 中时
+        缓存为 None
+        """
+        tile = self.tile
+        width = im_array.shape[1]
+        top = max(band * tile - y_offset, 1)
+        bottom = min((band + 1) * tile - y_offset, im_array.shape[0])
+        if bottom <= top:
+            return top, None
+        pixels = im_array[top - 1:bottom]
+        cached = self._bands.get(band)
+        columns = (width + tile - 1) // tile
+        if cached is None or cached[0].shape != pixels.shape:
+            cached = [pixels.copy(), np.zeros((bottom - top, width), bool),
+                      np.zeros(columns, bool)]
+            self._bands[band] = cached
+            return top, cached
+        # 只比较需要的列，其余列的缓存和它们的像素仍然对应
+        left, right = first * tile, min(last * tile, width)
+        old, new = cached[0][:, left:right], pixels[:, left:right]
+        if new.shape[2] == 4 and new.strides[2] == 1 and new.strides[1] == 4:
+            # RGBA 一个像素按一个 uint32 比较
+            changed = (_as_uint32(new) != _as_uint32(old)).any(axis=0)
+        else:
+            changed = (new != old).any(axis=2).any(axis=0)
+        if changed.any():
+            padded = np.zeros((last - first) * tile, bool)
+            padded[:right - left] = changed
+            cached[2][first:last] &= ~padded.reshape(-1, tile).any(axis=1)
+            old[...] = new
+        return top, cached
+
+    def find_board_top(self, im_array, x_start, x_end, y_start, y_end,
+                       y_offset=0, threshold=None):
+        """
+        参数和返回值与 find_board_top 相同
+        """
+        threshold = _threshold(
+            self.threshold if threshold is None else threshold)
+        layout = (im_array.shape, y_offset, threshold)
+        if layout != self._layout:
+            self._layout = layout
+            self._bands = {}
+        x_start, x_end = _span(x_start, x_end)
+        y_start, y_end = int(y_start), int(y_end)
+        if y_offset:
+            # 截取的一段中，第一行没有上一行可以比较
+            y_start = max(y_start, y_offset + 1)
+        elif y_start < 1:
+            # 第 0 行与原来的扫描方式一样和最后一行比较，不缓存
+            result = find_board_top(im_array, x_start, x_end, y_start,
+                                    min(y_end, 1), 0, threshold)
+            if result is not None:
+                return result
+            y_start = 1
+        tile = self.tile
+        first, last = x_start // tile, (x_end + tile - 1) // tile
+        for band in range(y_start // tile, (y_end + tile - 1) // tile):
+            top, cached = self._band(im_array, y_offset, band, first, last)
+            if cached is None:
+                break
+            pixels, hits, known = cached
+            unknown = first + np.flatnonzero(~known[first:last])
+            self.reused_tiles += last - first - len(unknown)
+            self.scanned_tiles += len(unknown)
+            # 相邻的未计算格子一起计算
+            for run in np.split(unknown,
+                                np.flatnonzero(np.diff(unknown) > 1) + 1):
+                if not len(run):
+                    continue
+                left, right = run[0] * tile, (run[-1] + 1) * tile
+                hits[:, left:right] = _l1_distance(
+                    pixels[1:, left:right], pixels[:-1, left:right]) \
+                    > threshold
+                known[run[0]:run[-1] + 1] = True
+            start = max(y_start - y_offset, top) - top
+            end = min(y_end - y_offset - top, hits.shape[0])
+            hit = hits[start:end, x_start:x_end]
+            rows = np.flatnonzero(hit.any(axis=1))
+            if len(rows):
+                row = rows[0]
+                xs = np.flatnonzero(hit[row])
+                return (int(xs.sum()) + x_start * len(xs)) / len(xs), \
+                    y_offset + top + start + int(row)
+        return None
+
+    def report(self):
+        return 'incremental: {} tiles reused, {} scanned'.format(
+            self.reused_tiles, self.scanned_tiles)
+
+
+def _foreground(block, top, bottom, threshold, background, im_array):
+    """
+    block 为 im_array 的 [top, bottom) 行中的一块，返回其中与该行背景色差
+    大于 threshold 的点
+    """
+    if background is not None:
+        colors = background.colors[top:bottom, np.newaxis]
+    else:
+        colors = im_array[top:bottom, 0:1, :3].astype(np.int16)
+    return np.abs(block[..., :3].astype(np.int16) - colors).sum(axis=-1) \
+        > threshold
+
+
+class BackgroundModel(object):
+    """
+    一帧的背景模型：每行的背景色为该行第 0 列的颜色，探测 scan_start_y、
+    扫描新块右顶点、iOS 扫描新块顶点时都与它比较；哪些行是纯色也只判断一次，
+    各阶段共用。背景渐变与上一帧相同时沿用上一帧的背景色
+    """
+
+    def __init__(self):
+        self.im_array = None
+        self.y_offset = 0
+        # (行数, 3) 的 int16 数组，每行的背景色
+        self.colors = None
+        self._column = None
+        # 每行是否为纯色，-1 为还没有判断
+        self._plain = None
+        self.reused = 0
+        self.rebuilt = 0
+
+    def update(self, im_array, y_offset=0):
+        """
+        每帧识别前调用，返回 self
+        """
+        column = im_array[:, 0]
+        if self._column is not None and self.y_offset == y_offset \
+                and np.array_equal(self._column, column):
+            self.reused += 1
+        else:
+            self._column = column.copy()
+            self.colors = column[:, :3].astype(np.int16)
+            self.rebuilt += 1
+        self.im_array = im_array
+        self.y_offset = y_offset
+        self._plain = np.full(im_array.shape[0], -1, np.int8)
+        return self
+
+    def _classify(self, rows):
+        """
+        判断 rows（im_array 中的行号数组）中还没有判断过的行是否为纯色
+        """
+        rows = rows[self._plain[rows] < 0]
+        if len(rows):
+            sample = self.im_array[rows]
+            changed = (sample[:, 1:] != sample[:, :1]).any(axis=2).any(axis=1)
+            self._plain[rows] = ~changed
+
+    def all_plain(self, top, bottom):
+        """
+        im_array 中 [top, bottom) 行是否都已知为纯色，只用已经判断过的结果
+        """
+        return bool((self._plain[top:bottom] == 1).all()) and bottom > top
+
+    def changed_row(self, rows):
+        """
+        与 find_changed_row 相同，rows 为截图中的行号
+        """
+        rows = [row for row in rows
+                if 0 <= row - self.y_offset < self.im_array.shape[0]]
+        if not rows:
+            return None
+        indexes = np.array(rows) - self.y_offset
+        self._classify(indexes)
+        changed = np.flatnonzero(self._plain[indexes] == 0)
+        if not len(changed):
+            return None
+        return rows[changed[0]]
+
+
+def find_changed_row(im_array, rows, y_offset=0):
+    """
+    在采样的 rows 中找第一行不是纯色的行，所有采样行一次比较完，
+    找不到时返回 None
+    """
+    rows = [row for row in rows
+            if 0 <= row - y_offset < im_array.shape[0]]
+    if not rows:
+        return None
+    sample = im_array[[row - y_offset for row in rows]]
+    changed = np.flatnonzero(
+        (sample[:, 1:] != sample[:, :1]).any(axis=2).any(axis=1))
+    if not len(changed):
+        return None
+    return rows[changed[0]]
+
+
+class ScanStartProbe(object):
+    """
+    探测 scan_start_y 用的颜色变化行，一局游戏中这一行基本不动，
+    所以缓存上一次找到的行，下一帧只要这一行仍不是纯色、它上面的采样行
+    都仍是纯色就直接复用，不用再判断它下面的采样行；否则重新扫描全部采样行
+    """
+
+    def __init__(self):
+        self.window = None
+        self.row = None
+        self.hits = 0
+        self.misses = 0
+
+    def find(self, im_array, start, stop, step, y_offset=0, background=None):
+        """
+        返回 range(start, stop, step) 中第一行不是纯色的行，找不到时返回 None；
+        background 为这一帧的 BackgroundModel，判断过的行其他阶段可以直接使用
+        """
+        window = (start, stop, step, im_array.shape[1])
+        if window == self.window and self.row is not None \
+                and self._still_valid(im_array, start, step, y_offset,
+                                      background):
+            self.hits += 1
+            return self.row
+        self.misses += 1
+        self.window = window
+        if background is not None:
+            self.row = background.changed_row(range(start, stop, step))
+        else:
+            self.row = find_changed_row(
+                im_array, range(start, stop, step), y_offset)
+        return self.row
+
+    def _still_valid(self, im_array, start, step, y_offset, background):
+        # 新块可能出现在缓存的行上方较远处，所以上面的采样行都要判断
+        rows = range(start, self.row + 1, step)
+        if background is not None:
+            return background.changed_row(rows) == self.row
+        return find_changed_row(im_array, rows, y_offset) == self.row
+
+
+class PieceTracker(object):
+    """
+    跨帧跟踪棋子：跳之前记住棋子最低一行预计落到的位置，下一帧先在它周围
+    的窗口中查找，找到的最低一行碰到窗口下边或左右两边时棋子可能不完整，
+    再全图扫描；预计位置与实际位置的偏差（如落地后画面的移动）记下来，
+    用于修正下一次的窗口
+
+    窗口中接受的结果不一定与全图扫描相同：全图扫描取整个扫描区域中最低的
+    一行棋子颜色的像素，窗口外更低的地方有颜色相近的像素（如新块上的图案）
+    时，全图扫描找到的是那里，窗口中找到的仍是棋子
+    """
+
+    def __init__(self, scale=1.0, rules=None):
+        self.half_width = int(TRACK_HALF_WIDTH * scale)
+        self.half_height = int(TRACK_HALF_HEIGHT * scale)
+        self.rules = rules
+        self.target = None
+        self.offset = (0, 0)
+        self.hits = 0
+        self.misses = 0
+
+    def expect(self, x, y):
+        """
+        棋子最低一行预计落到 (x, y)
+        """
+        self.target = (x, y)
+
+    def find(self, search, im_array, x_start, x_end, y_start, y_end,
+             y_offset=0):
+        """
+        用 search（find_piece_bottom 或同样参数的函数）查找棋子，
+        返回值与 search 相同
+        """
+        result = None
+        if self.target is not None:
+            result = self._search_window(search, im_array, x_start, x_end,
+                                         y_start, y_end, y_offset)
+        if result is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            result = search(im_array, x_start, x_end, y_start, y_end,
+                            y_offset)
+        if result is not None and self.target is not None:
+            self.offset = (int(result[0]) - self.target[0],
+                           result[1] - self.target[1])
+        self.target = None
+        return result
+
+    def _search_window(self, search, im_array, x_start, x_end, y_start,
+                       y_end, y_offset):
+        x = self.target[0] + self.offset[0]
+        y = self.target[1] + self.offset[1]
+        left = int(max(x - self.half_width, x_start))
+        right = int(min(x + self.half_width, x_end))
+        top = int(max(y - self.half_height, y_start, y_offset))
+        bottom = int(min(y + self.half_height, y_end,
+                         y_offset + im_array.shape[0]))
+        if left >= right or top >= bottom:
+            return None
+        result = search(im_array, left, right, top, bottom, y_offset)
+        if result is None:
+            return None
+        row = result[1]
+        # 最低一行在窗口下边时下面可能还有，碰到左右两边时平均 x 不准
+        if row == bottom - 1 and bottom < y_end:
+            return None
+        line = im_array[row - y_offset]
+        touched = piece_mask(line[np.newaxis, [left, right - 1]],
+                             self.rules)[0]
+        if touched[0] and left > x_start or touched[1] and right < x_end:
+            return None
+        return result
+
+    def report(self):
+        return 'piece tracker: {} hits, {} misses'.format(self.hits,
+                                                         self.misses)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+用连通域一次分割出棋子和新块，代替分别扫描棋子和新块顶点、右顶点的几次扫描
+识别区域中与该行背景色差大于阈值的点和棋子颜色的点合成一个掩码，只标记一次
+连通域，棋子和新块都从这一次的结果中取得，同时得到亚像素精度的质心
+需要 opencv-python
+"""
+from __future__ import division
+import numpy as np
+import cv2
+from common.detector import scan
+from common.detector.engine import Engine, Location
+
+# 面积小于此值的连通域不作为新块，按 1440 宽的屏幕
+MIN_BLOCK_AREA = 400
+
+
+class Segments(object):
+    """
+    一次分割的结果，行号都是整张截图中的行号，找不到时为 None
+        piece_bottom    棋子最低一行 (该行所有点的平均 x, 行号)
+        piece_centroid  所有棋子颜色的点的 (平均 x, 平均 y)
+        board_top       新块最上面一行 (该行所有点的平均 x, 行号)
+        board_right     新块最右一列 (列号, 该列最上面的点的行号)
+        board_centroid  新块连通域的 (平均 x, 平均 y)
+    """
+
+    def __init__(self):
+        self.piece_bottom = None
+        self.piece_centroid = None
+        self.board_top = None
+        self.board_right = None
+        self.board_centroid = None
+
+
+class JointSegmentation(object):
+    """
+    参数与配置文件中的同名参数相同：新块只在棋子的另一侧、棋子底座中心以上
+    找，右顶点只在新块顶点以下 right_scan_height 行中找；
+    rules 为 scan.ColorRules，为空时使用 scan.use_config 设置的规则
+    """
+
+    def __init__(self, piece_body_width, piece_body_height_1_2,
+                 right_scan_height, scale=1.0, rules=None):
+        self.piece_body_width = piece_body_width
+        self.piece_body_height_1_2 = piece_body_height_1_2
+        self.right_scan_height = right_scan_height
+        self.min_area = int(MIN_BLOCK_AREA * scale * scale)
+        self.rules = rules or scan.current_rules()
+
+    def find(self, im_array, x_start, x_end, y_start, y_end, y_offset=0):
+        """
+        标记 [y_start, y_end) 行的连通域，棋子只在 [x_start, x_end) 列中找，
+        返回 Segments
+        """
+        result = Segments()
+        top, bottom = scan._span(y_start, y_end, y_offset)
+        band = np.ascontiguousarray(im_array[top:bottom])
+        foreground = self._foreground(band)
+        piece = np.zeros_like(foreground)
+        x_start, x_end = scan._span(x_start, x_end)
+        piece[:, x_start:x_end] = self.rules.piece_mask(
+            band[:, x_start:x_end])
+        _, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            cv2.bitwise_or(foreground, piece), connectivity=8)
+        self._find_piece(result, piece, y_offset + top)
+        if result.piece_bottom is not None:
+            self._find_board(result, foreground, labels, stats, centroids,
+                             y_offset + top)
+        return result
+
+    def _foreground(self, band):
+        """
+        与 scan._foreground 相同，用 OpenCV 计算，返回 0/1 的 uint8 数组
+        """
+        background = cv2.repeat(np.ascontiguousarray(band[:, :1]), 1,
+                                 band.shape[1])
+        channels = cv2.split(cv2.absdiff(band, background))
+        # 饱和加法，和超过 255 时仍大于阈值
+        diff = cv2.add(cv2.add(channels[0], channels[1]), channels[2])
+        return cv2.threshold(diff, self.rules.threshold, 1,
+                             cv2.THRESH_BINARY)[1]
+
+    def _find_piece(self, result, piece, row_offset):
+        rows = np.flatnonzero(piece.any(axis=1))
+        if not len(rows):
+            return
+        row = rows[-1]
+        xs = np.flatnonzero(piece[row])
+        result.piece_bottom = int(xs.sum()) / len(xs), row_offset + int(row)
+        moments = cv2.moments(piece, binaryImage=True)
+        result.piece_centroid = moments['m10'] / moments['m00'], \
+            row_offset + moments['m01'] / moments['m00']
+
+    def _find_board(self, result, foreground, labels, stats, centroids,
+                    row_offset):
+        """
+        与 find_board 相同，在棋子另一侧找最上面的点所在的连通域
+        """
+        width = foreground.shape[1]
+        piece_x = int(result.piece_bottom[0])
+        if piece_x < width / 2:
+            x_start = int(piece_x + self.piece_body_width / 2)
+            x_end = width - 1
+        else:
+            x_start = 0
+            x_end = int(piece_x - self.piece_body_width / 2)
+        y_end = result.piece_bottom[1] - row_offset \
+            - self.piece_body_height_1_2
+        if x_end <= x_start or y_end <= 0:
+            return
+        region = labels[:y_end, x_start:x_end]
+        large = stats[:, cv2.CC_STAT_AREA] >= self.min_area
+        large[0] = False
+        hit = foreground[:y_end, x_start:x_end].astype(bool) & large[region]
+        rows = np.flatnonzero(hit.any(axis=1))
+        if not len(rows):
+            return
+        row = rows[0]
+        xs = np.flatnonzero(hit[row])
+        # 一行中碰到多个连通域时取点最多的那个
+        label = np.bincount(region[row, xs]).argmax()
+        xs = xs[region[row, xs] == label] + x_start
+        result.board_top = int(xs.sum()) / len(xs), row_offset + int(row)
+        if self.right_scan_height:
+            block = labels[row:row + self.right_scan_height] == label
+            right = np.flatnonzero(block.any(axis=0))[-1]
+            result.board_right = int(right), \
+                row_offset + int(row) + int(block[:, right].argmax())
+        result.board_centroid = float(centroids[label][0]), \
+            row_offset + float(centroids[label][1])
+
+
+class SegmentationEngine(Engine):
+    name = 'segmentation'
+
+    def __init__(self, config, **options):
+        super(SegmentationEngine, self).__init__(config, **options)
+        self.segmentation = JointSegmentation(
+            self.piece_body_width, self.board_margin, self.right_scan_height,
+            self.scale, self.rules)
+
+    def _locate(self, frame):
+        w, h = frame.size
+        location = Location(self.find_scan_start_y(frame))
+        scan_start_x = int(w / 8)
+        segments = self.segmentation.find(
+            frame.array, scan_start_x, w - scan_start_x,
+            location.scan_start_y, int(h * 2 / 3) + 1, frame.y_offset)
+        location.piece_bottom = segments.piece_bottom
+        location.piece_centroid = segments.piece_centroid
+        location.board_top = segments.board_top
+        location.board_centroid = segments.board_centroid
+        if segments.board_right is not None:
+            location.board_right_y = segments.board_right[1]
+        return location
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+模板匹配引擎：与 wechat_jump.py 原来的做法一样，用棋子的截图作为模板，
+在缩小后的截图中用 cv2.matchTemplate 找棋子，新块与 NumPy 引擎相同
+需要 opencv-python
+"""
+from __future__ import division
+import numpy as np
+import cv2
+from common.detector.vectorized import NumpyEngine
+
+# 棋子的模板，截取自同一分辨率的截图
+TEMPLATE_FILE = 'character.png'
+# 匹配前截图和模板都缩小到的比例
+TEMPLATE_SCALE = 0.25
+
+
+class TemplateEngine(NumpyEngine):
+    """
+    template 为模板文件，template_scale 为匹配时的缩小比例
+    """
+    name = 'template'
+
+    def __init__(self, config, template=TEMPLATE_FILE,
+                 template_scale=TEMPLATE_SCALE, **options):
+        options['track'] = False
+        super(TemplateEngine, self).__init__(config, **options)
+        image = cv2.imread(template)
+        if image is None:
+            raise IOError('无法读取棋子模板 {}'.format(template))
+        # 截图是 RGB 的，cv2 读出的是 BGR
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        self.template = cv2.resize(image, (0, 0), fx=template_scale,
+                                   fy=template_scale)
+        self.template_scale = template_scale
+
+    def find_piece(self, frame, scan_start_y):
+        """
+        返回模板最匹配的位置的 (中点 x, 最下面一行)，找的区域与其他引擎相同
+        """
+        w, h = frame.size
+        top = max(scan_start_y + 1, frame.y_offset)
+        bottom = min(int(h * 2 / 3) + 1, frame.y_offset + frame.array.shape[0])
+        left = int(w / 8)
+        region = np.ascontiguousarray(
+            frame.array[top - frame.y_offset:bottom - frame.y_offset,
+                        left:w - left, :3])
+        scale = self.template_scale
+        region = cv2.resize(region, (0, 0), fx=scale, fy=scale)
+        height, width = self.template.shape[:2]
+        if region.shape[0] < height or region.shape[1] < width:
+            return None
+        result = cv2.matchTemplate(region, self.template, cv2.TM_SQDIFF)
+        _, _, min_loc, _ = cv2.minMaxLoc(result)
+        return left + (min_loc[0] + width / 2) / scale, \
+            top + int((min_loc[1] + height) / scale) - 1
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+NumPy 引擎：scan 模块中的逐行扫描，可以打开金字塔搜索、增量扫描和
+跨帧跟踪棋子
+"""
+from __future__ import division
+from common import timing
+from common.detector import scan
+from common.detector.engine import Engine, Location
+
+
+class NumpyEngine(Engine):
+    """
+    pyramid_factor、incremental、verify 与 scan.PyramidSearch 的参数相同，
+    track 为 True 时先在上一次 expect 的位置附近找棋子，见 scan.PieceTracker
+    """
+    name = 'numpy'
+
+    def __init__(self, config, pyramid_factor=None, incremental=False,
+                 verify=False, track=False, **options):
+        super(NumpyEngine, self).__init__(config, **options)
+        self.search = scan.PyramidSearch(pyramid_factor, verify=verify,
+                                         incremental=incremental,
+                                         rules=self.rules)
+        self.tracker = scan.PieceTracker(self.scale, self.rules) \
+            if track else None
+
+    def _locate(self, frame):
+        location = Location(self.find_scan_start_y(frame))
+        with timing.span('piece'):
+            location.piece_bottom = self.find_piece(frame,
+                                                    location.scan_start_y)
+        if location.piece_bottom is None:
+            return location
+        with timing.span('board'):
+            location.board_top = self.find_board_top(
+                frame, location.scan_start_y, location.piece_bottom)
+            if location.board_top is not None and self.right_scan_height:
+                board_x, board_y_top = location.board_top
+                location.board_right_y = scan.find_board_right_y(
+                    frame.array, int(board_x), board_y_top,
+                    board_y_top + self.right_scan_height, frame.y_offset,
+                    self.rules.threshold, self.background)
+        return location
+
+    def find_piece(self, frame, scan_start_y):
+        """
+        返回棋子最低一行 (平均 x, 行号)
+        """
+        w, h = frame.size
+        scan_start_x = int(w / 8)
+        args = (frame.array, scan_start_x, w - scan_start_x,
+                scan_start_y + 1, int(h * 2 / 3) + 1, frame.y_offset)
+        if self.tracker is not None:
+            return self.tracker.find(self.search.find_piece_bottom, *args)
+        return self.search.find_piece_bottom(*args)
+
+    def find_board_top(self, frame, scan_start_y, piece_bottom):
+        x_start, x_end = self.board_columns(int(piece_bottom[0]),
+                                            frame.size[0])
+        return self.search.find_board_top(
+            frame.array, x_start, x_end, scan_start_y,
+            piece_bottom[1] - self.board_margin, frame.y_offset)
+
+    def expect(self, x, row):
+        if self.tracker is not None:
+            self.tracker.expect(x, row)
+
+    def report(self):
+        parts = [super(NumpyEngine, self).report()]
+        search = self.search.report()
+        if search:
+            parts.append(search)
+        if self.tracker is not None:
+            parts.append(self.tracker.report())
+        return ', '.join(parts)
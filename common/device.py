@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+设备信息缓存，屏幕大小、密度、截图方式和配置文件路径以 serial 和系统指纹
+为键保存在 device_profiles.json 中。再次启动时只需一次 adb 调用读取指纹，
+换了设备或系统升级后指纹变化，自动重新检测
+"""
+from __future__ import print_function
+import os
+import sys
+import json
+import threading
+from common import config, screenshot
+from common.adb import adb_command
+
+PROFILE_CACHE_FILE = 'device_profiles.json'
+# 缓存内容的格式变化时加一，旧的记录会被重新检测
+PROFILE_VERSION = 2
+
+# 检测时同时执行的查询
+PROBE_COMMANDS = {
+    'size': 'shell wm size',
+    'density': 'shell wm density',
+    'device': 'shell getprop ro.product.device',
+    'model': 'shell getprop ro.product.model',
+    'phone_os': 'shell getprop ro.build.version.release',
+}
+
+_cache_lock = threading.Lock()
+
+
+def read_identity(serial=None):
+    """
+    一次 adb 调用读取 (设备的 serial, 系统指纹)
+    """
+    output = os.popen(adb_command(
+        'shell "getprop ro.serialno; getprop ro.build.fingerprint"',
+        serial)).read()
+    lines = [line.strip() for line in output.splitlines()]
+    if len(lines) < 2 or not lines[1]:
+        print('请安装 ADB 及驱动并配置环境变量')
+        sys.exit()
+    return lines[0], lines[1]
+
+
+def probe_device(serial=None, shot=None):
+    """
+    同时执行 PROBE_COMMANDS 中的查询，返回去掉首尾空白的输出；
+    指定 shot 时同时检查它的截图方式
+    """
+    info = {}
+
+    def probe(key, args):
+        info[key] = os.popen(adb_command(args, serial)).read().strip()
+
+    threads = [threading.Thread(target=probe, args=item)
+               for item in PROBE_COMMANDS.items()]
+    if shot is not None:
+        threads.append(threading.Thread(target=shot.check))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return info
+
+
+def detect_profile(serial=None):
+    """
+    检测设备信息，返回可以写入缓存的 dict
+    """
+    shot = screenshot.Screenshot(serial)
+    profile = probe_device(serial, shot)
+    if shot.way < 0:
+        # check 在线程中调用 sys.exit 只会结束那个线程
+        sys.exit()
+    screen_size = config.parse_screen_size(profile['size'])
+    profile.update(
+        version=PROFILE_VERSION,
+        screen_size=screen_size,
+        config_file=config.match_config(screen_size, profile['model']),
+        screenshot_way=shot.way,
+        raw_layout=shot.raw_layout,
+    )
+    return profile
+
+
+def _read_cache(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _is_valid(profile):
+    return profile.get('version') == PROFILE_VERSION \
+        and os.path.exists(profile.get('config_file', ''))
+
+
+def load_profile(serial=None, path=PROFILE_CACHE_FILE):
+    """
+    返回设备信息，缓存中有同一 serial 和指纹的记录时直接使用，
+    否则重新检测并写入缓存；serial 为空时使用默认设备
+    """
+    device_serial, fingerprint = read_identity(serial)
+    key = '{}|{}'.format(serial or device_serial, fingerprint)
+    profile = _read_cache(path).get(key)
+    if profile and _is_valid(profile):
+        print('使用缓存的设备信息 {}'.format(path))
+    else:
+        profile = detect_profile(serial)
+        profile.update(serial=serial or device_serial,
+                       fingerprint=fingerprint)
+        with _cache_lock:
+            # 多台设备可能同时写入，重新读取后只更新自己的记录
+            profiles = _read_cache(path)
+            profiles[key] = profile
+            with open(path, 'w') as f:
+                json.dump(profiles, f, indent=2, sort_keys=True)
+    if profile['raw_layout'] is not None:
+        profile['raw_layout'] = tuple(profile['raw_layout'])
+    return profile
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+假的 adb，不连接手机也能测试多设备运行和截图、按压的代码
+
+    python common/fake_adb.py install DIR
+
+会在 DIR 中生成名为 adb 的脚本，把 DIR 放到 PATH 的最前面即可使用。
+通过环境变量设置：
+    FAKE_ADB_SERIALS  设备列表，用逗号分隔，默认 fake-0
+    FAKE_ADB_SIZE     屏幕大小，默认 1080x1920
+    FAKE_ADB_SCREEN   作为截图的 PNG 文件，默认为纯色背景
+    FAKE_ADB_LOG      记录每条按压命令的文件
+    FAKE_ADB_TIME_SCALE  按压时实际等待的比例，默认 0 不等待
+"""
+from __future__ import print_function, division
+import os
+import io
+import re
+import sys
+import stat
+import time
+import struct
+
+_stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+
+
+def install(directory):
+    """
+    在 directory 中生成调用本文件的 adb 脚本，返回脚本路径
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    script = os.path.abspath(__file__)
+    if sys.platform == 'win32':
+        path = os.path.join(directory, 'adb.bat')
+        with open(path, 'w') as f:
+            f.write('@"{}" "{}" %*\n'.format(sys.executable, script))
+    else:
+        path = os.path.join(directory, 'adb')
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(
+                sys.executable, script))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def _serials():
+    return os.environ.get('FAKE_ADB_SERIALS', 'fake-0').split(',')
+
+
+def _size():
+    width, height = os.environ.get('FAKE_ADB_SIZE', '1080x1920').split('x')
+    return int(width), int(height)
+
+
+def _screen():
+    """
+    返回 (RGBA 原始像素, PNG 数据)
+    """
+    from PIL import Image
+    path = os.environ.get('FAKE_ADB_SCREEN')
+    if path:
+        im = Image.open(path).convert('RGBA')
+    else:
+        im = Image.new('RGBA', _size(), (220, 220, 230, 255))
+    buf = io.BytesIO()
+    im.save(buf, 'png')
+    return im.tobytes(), im.size, buf.getvalue()
+
+
+def _raw_screencap():
+    pixels, (width, height), _ = _screen()
+    return struct.pack('<IIII', width, height, 1, 0) + pixels
+
+
+def _log(serial, cmd):
+    path = os.environ.get('FAKE_ADB_LOG')
+    if path:
+        with open(path, 'a') as f:
+            f.write('{:.3f} {} {}\n'.format(time.time(), serial, cmd))
+
+
+def _run(serial, line):
+    """
+    执行一行 shell 命令，返回输出，exit 时返回 None
+    """
+    output = b''
+    for cmd in line.split(';'):
+        cmd = cmd.strip()
+        m = re.match(r'screencap \| tail -c \+(\d+) \| head -c (\d+)$', cmd)
+        if cmd == 'exit':
+            return None
+        elif m:
+            start = int(m.group(1)) - 1
+            output += _raw_screencap()[start:start + int(m.group(2))]
+        elif cmd == 'screencap':
+            output += _raw_screencap()
+        elif cmd == 'screencap -p':
+            output += _screen()[2]
+        elif cmd.startswith('screencap -p '):
+            pass
+        elif cmd == 'wm size':
+            output += 'Physical size: {}x{}\n'.format(*_size()).encode()
+        elif cmd == 'wm density':
+            output += b'Physical density: 480\n'
+        elif cmd.startswith('getprop '):
+            prop = cmd.split()[1]
+            value = {'ro.serialno': serial,
+                     'ro.build.fingerprint': 'fake/{}/1:8.0.0'.format(serial),
+                     'ro.build.version.release': '8.0.0',
+                     'ro.product.model': 'fake'}.get(prop, 'fake')
+            output += (value + '\n').encode()
+        elif cmd.startswith('echo '):
+            output += (cmd[5:] + '\n').encode()
+        elif cmd.startswith('input swipe '):
+            _log(serial, cmd)
+            scale = float(os.environ.get('FAKE_ADB_TIME_SCALE', 0))
+            time.sleep(int(cmd.split()[-1]) / 1000 * scale)
+    return output
+
+
+def main(argv):
+    serial = _serials()[0]
+    if argv[:1] == ['-s']:
+        serial, argv = argv[1], argv[2:]
+    if not argv:
+        return 1
+    if serial not in _serials():
+        print("error: device '{}' not found".format(serial), file=sys.stderr)
+        return 1
+    if argv[0] == 'devices':
+        print('List of devices attached')
+        for name in _serials():
+            print('{}\tdevice'.format(name))
+    elif argv[0] == 'pull':
+        with open(argv[2], 'wb') as f:
+            f.write(_screen()[2])
+    elif argv[0] == 'install' and len(argv) == 2:
+        print(install(argv[1]))
+    elif argv[0] in ('shell', 'exec-out') and len(argv) > 1:
+        _stdout.write(_run(serial, ' '.join(argv[1:])) or b'')
+    elif argv[0] == 'shell':
+        # 交互式 shell，逐行执行 stdin 中的命令
+        while True:
+            line = sys.stdin.readline()
+            if not line:
+                break
+            output = _run(serial, line)
+            if output is None:
+                break
+            _stdout.write(output)
+            _stdout.flush()
+    else:
+        return 1
+    _stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
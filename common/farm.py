@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+多台设备同时运行的代码，每台设备有各自的配置、截图方法、按压用的 adb shell
+和识别状态，每台设备一个线程，定时输出每台设备和整台电脑的跳跃速度
+"""
+from __future__ import print_function, division
+import time
+import math
+import random
+import threading
+from common import config, screenshot, detector, settle, flight, shell, \
+    device
+from common.adb import adb_command, list_devices
+
+
+class DeviceSession(object):
+    """
+    一台设备的会话，识别和按压的方式与 wechat_jump_auto.py 相同
+    """
+
+    def __init__(self, serial, canonical_width=None):
+        self.serial = serial
+        self.profile = device.load_profile(serial)
+        self.config = config.load_config(self.profile['config_file'],
+                                         self.profile['screen_size'],
+                                         canonical_width)
+        # 每台设备的配置可以有各自的颜色判断规则
+        self.rules = detector.compile_rules(self.config)
+        self.screenshot = screenshot.Screenshot(
+            serial, self.profile['screenshot_way'], self.profile['raw_layout'],
+            canonical_width)
+        self.input_shell = shell.AdbShell(adb_command('shell', serial))
+        self.engine = detector.create_engine(
+            self.config.get('detector_engine'), self.config, rules=self.rules)
+        self.settle_detector = settle.SettleDetector()
+        self.flight_model = flight.FlightModel()
+        self.frame = None
+        self.jumps = 0
+        self.errors = 0
+        self.started = None
+
+    def start(self):
+        self.frame = self.screenshot.pull_frame()
+        self.started = time.time()
+
+    def locate(self, frame):
+        """
+        返回 (piece_x, piece_y, board_x, board_y)，都在 frame 的坐标中
+        """
+        return detector.jump_points(self.engine.locate(frame), self.config)
+
+    def press(self, distance, w, h):
+        """
+        在 `再来一局` 按钮附近按压，返回按压时间
+        """
+        press_time = int(max(distance + self.config['press_coefficient'],
+                             200))
+        x = int(random.uniform(w / 2 - 50, w / 2 + 50))
+        y = int(random.uniform(1584 * (h / 1920.0) - 10,
+                               1584 * (h / 1920.0) + 10))
+        self.input_shell.swipe(x, y, x, y, press_time)
+        return press_time
+
+    def step(self):
+        """
+        完成一次跳跃，并等到落稳后获取下一帧
+        """
+        piece_x, piece_y, board_x, board_y = self.locate(self.frame)
+        piece_x, piece_y = self.frame.to_device(piece_x, piece_y)
+        board_x, board_y = self.frame.to_device(board_x, board_y)
+        w, h = self.frame.device_size
+        self.frame.close()
+        press_time = self.press(
+            math.sqrt((board_x - piece_x) ** 2 + (board_y - piece_y) ** 2),
+            w, h)
+        self.frame = self.settle_detector.wait(
+            self.screenshot.pull_frame, self.flight_model.deadline(press_time))
+        if not self.settle_detector.timed_out:
+            self.flight_model.update(
+                press_time, self.settle_detector.settled_after)
+        self.jumps += 1
+
+    def jumps_per_minute(self):
+        if not self.started:
+            return 0
+        return self.jumps * 60 / max(time.time() - self.started, 1e-6)
+
+    def close(self):
+        self.input_shell.close()
+        if self.frame is not None:
+            self.frame.close()
+
+
+class Farm(object):
+    """
+    serials 为空时使用所有已连接的设备，session_factory 用来创建每台设备的会话
+    """
+
+    def __init__(self, serials=None, session_factory=DeviceSession):
+        if serials is None:
+            serials = list_devices()
+        if not serials:
+            raise RuntimeError('没有找到已连接的设备')
+        self.sessions = [session_factory(serial) for serial in serials]
+        self.started = None
+        self._stop = threading.Event()
+
+    def _run_session(self, session, max_jumps):
+        try:
+            session.start()
+        except Exception as ex:
+            print('{} 启动失败: {}'.format(session.serial, ex))
+            return
+        while not self._stop.is_set():
+            if max_jumps is not None and session.jumps >= max_jumps:
+                break
+            try:
+                session.step()
+            except Exception as ex:
+                session.errors += 1
+                print('{} 跳跃失败: {}'.format(session.serial, ex))
+                time.sleep(1)
+        session.close()
+
+    def run(self, max_jumps=None, duration=None, report_interval=30):
+        """
+        所有设备同时运行，每台设备跳 max_jumps 次或运行 duration 秒后结束，
+        两者都为空时一直运行到 Ctrl-C
+        """
+        self.started = time.time()
+        threads = []
+        for session in self.sessions:
+            thread = threading.Thread(
+                target=self._run_session, args=(session, max_jumps))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        last_report = time.time()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                if duration is not None \
+                        and time.time() - self.started >= duration:
+                    break
+                time.sleep(0.1)
+                if time.time() - last_report >= report_interval:
+                    print(self.report())
+                    last_report = time.time()
+        except KeyboardInterrupt:
+            pass
+        self._stop.set()
+        for thread in threads:
+            thread.join()
+        print(self.report())
+
+    def jumps_per_minute(self):
+        """
+        整台电脑的跳跃速度
+        """
+        if not self.started:
+            return 0
+        jumps = sum(session.jumps for session in self.sessions)
+        return jumps * 60 / max(time.time() - self.started, 1e-6)
+
+    def report(self):
+        lines = ['{:<24} {:>8} {:>8} {:>10}'.format(
+            'device', 'jumps', 'errors', 'jumps/min')]
+        for session in self.sessions:
+            lines.append('{:<24} {:>8} {:>8} {:>10.1f}'.format(
+                session.serial, session.jumps, session.errors,
+                session.jumps_per_minute()))
+        lines.append('{:<24} {:>8} {:>8} {:>10.1f}'.format(
+            'total', sum(session.jumps for session in self.sessions),
+            sum(session.errors for session in self.sessions),
+            self.jumps_per_minute()))
+        return '\n'.join(lines)
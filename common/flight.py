@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+飞行时间模型，根据按压时间预测棋子从按压结束到落稳需要的时间，
+用来安排下一次截图的时间，不再盲目地轮询
+"""
+from __future__ import division
+import os
+import json
+from collections import deque
+
+# 样本文件的格式版本，落稳检测的方式变化后加一，旧的样本测得的落稳时间不准，
+# 读取时跳过
+SAMPLE_VERSION = 2
+
+
+class FlightModel(object):
+    """
+    落稳时间 = intercept + slope * press_time（press_time 单位为毫秒，
+    落稳时间单位为秒），样本来自落稳检测或记录下来的样本文件，
+    用最近 max_samples 个样本做最小二乘拟合
+    path 不为空时，会先读取其中的样本，之后每个新样本都追加写入
+    """
+
+    def __init__(self, path=None, intercept=0.8, slope=0.0, margin=0.15,
+                 min_samples=5, max_samples=200):
+        self.path = path
+        self.intercept = intercept
+        self.slope = slope
+        # 预测时间提前 margin 秒开始截图，避免错过落稳的时刻
+        self.margin = margin
+        self.min_samples = min_samples
+        self.samples = deque(maxlen=max_samples)
+        # 每个样本的预测误差（预测值 - 实际值）
+        self.errors = deque(maxlen=max_samples)
+        if path and os.path.isfile(path):
+            self.load(path)
+
+    def load(self, path):
+        """
+        读取记录的样本，每行一个 {"press_time": ..., "settle_time": ...}，
+        跳过版本不是 SAMPLE_VERSION 的样本
+        """
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    sample = json.loads(line)
+                    if sample.get('version') != SAMPLE_VERSION:
+                        continue
+                    self.samples.append(
+                        (sample['press_time'], sample['settle_time']))
+        self.fit()
+
+    def predict(self, press_time):
+        """
+        预测按压 press_time 毫秒之后的落稳时间
+        """
+        return max(self.intercept + self.slope * press_time, 0)
+
+    def deadline(self, press_time):
+        """
+        按压结束后应开始截图的时间
+        """
+        return max(self.predict(press_time) - self.margin, 0)
+
+    def update(self, press_time, settle_time):
+        """
+        加入一个实际的样本，记录预测误差并重新拟合，返回预测误差
+        """
+        error = self.predict(press_time) - settle_time
+        self.errors.append(error)
+        self.samples.append((press_time, settle_time))
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'version': SAMPLE_VERSION,
+                                    'press_time': press_time,
+                                    'settle_time': round(settle_time, 4),
+                                    'error': round(error, 4)}) + '\n')
+        self.fit()
+        return error
+
+    def fit(self):
+        n = len(self.samples)
+        if n < self.min_samples:
+            return
+        mean_x = sum(x for x, _ in self.samples) / n
+        mean_y = sum(y for _, y in self.samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in self.samples)
+        if var_x:
+            self.slope = sum((x - mean_x) * (y - mean_y)
+                             for x, y in self.samples) / var_x
+        else:
+            self.slope = 0.0
+        self.intercept = mean_y - self.slope * mean_x
+
+    def mean_abs_error(self):
+        """
+        最近样本预测误差绝对值的平均值，没有样本时返回 0
+        """
+        if not self.errors:
+            return 0.0
+        return sum(abs(e) for e in self.errors) / len(self.errors)
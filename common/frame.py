@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+在内存中传递的一帧截图，从获取截图、识别、跳跃到 debug 存档都不经过磁盘，
+只有调用 save 时才写入文件
+"""
+import time
+import numpy as np
+from PIL import Image
+
+
+class Frame(object):
+    """
+    array 为 (h, w, c) 的 uint8 数组，可能只是整张截图中从第 y_offset 行开始
+    的一段，size 为整张截图的 (w, h)；encoded 为截图原本的 PNG 数据，
+    保存时直接写入，不再重新编码；缩放后的一帧 source 为缩放前的那一帧，
+    scale 为相对它的缩放比例
+    """
+
+    def __init__(self, array, y_offset=0, size=None, image=None,
+                 encoded=None, ts=None):
+        self.array = array
+        self.y_offset = y_offset
+        if size is None:
+            size = (array.shape[1], array.shape[0] + y_offset)
+        self.size = size
+        self.encoded = encoded
+        self.ts = time.time() if ts is None else ts
+        self._image = image
+        self.source = None
+        self.scale = 1.0
+
+    @property
+    def image(self):
+        """
+        这一帧对应的 PIL 图片，第一次使用时才创建，与 array 共用内存
+        """
+        if self._image is None:
+            self._image = Image.fromarray(self.array)
+        return self._image
+
+    def save(self, path):
+        """
+        将这一帧写入 path
+        """
+        if self.encoded is not None:
+            with open(path, 'wb') as f:
+                f.write(self.encoded)
+        else:
+            self.image.save(path)
+
+    @property
+    def device_size(self):
+        """
+        手机屏幕上的 (w, h)
+        """
+        return self.device_frame.size
+
+    @property
+    def device_frame(self):
+        """
+        缩放前的那一帧，没有缩放时为自己
+        """
+        if self.source is not None:
+            return self.source.device_frame
+        return self
+
+    def scaled(self, width):
+        """
+        返回缩放到 width 宽的一帧，按最近邻取样，不会产生截图中没有的颜色；
+        返回的 Frame 的 size、y_offset 都在缩放后的坐标中
+        """
+        w, h = self.size
+        scale = width / float(w)
+        height = int(round(h * scale))
+        # 缩放后的每一行、每一列对应原图中的行、列
+        rows = np.minimum((np.arange(height) / scale).astype(int), h - 1)
+        cols = np.minimum((np.arange(width) / scale).astype(int), w - 1)
+        keep = np.nonzero((rows >= self.y_offset) & (
+            rows < self.y_offset + self.array.shape[0]))[0]
+        array = self.array[np.ix_(rows[keep] - self.y_offset, cols)]
+        frame = Frame(array, int(keep[0]) if len(keep) else 0,
+                      (width, height), ts=self.ts)
+        frame.source = self
+        frame.scale = scale
+        return frame
+
+    def to_device(self, x, y):
+        """
+        把这一帧中的坐标换算为手机屏幕上的坐标，没有缩放时原样返回
+        """
+        if self.source is None:
+            return x, y
+        return self.source.to_device(int(round(x / self.scale)),
+                                     int(round(y / self.scale)))
+
+    def close(self):
+        if self._image is not None:
+            self._image.close()
+            self._image = None
+        if self.source is not None:
+            self.source.close()
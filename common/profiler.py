@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+主循环的采样 profiler，脚本加 --profile 运行时使用：
+
+    python wechat_jump_auto.py --profile [--profile-every N]
+                               [--profile-duration 秒]
+
+每 N 帧取一帧（默认每一帧），在这一帧的循环中用后台线程定时采样主线程的
+调用栈，同时打开 cProfile；到 --profile-duration 秒或程序退出时写入
+profiles/ 目录：
+    <session>.folded    折叠的调用栈，每行为 "栈 次数"，可以直接交给
+                        flamegraph.pl 或 speedscope；栈的最外层为
+                        common/timing.py 中的阶段名，如 capture/decode
+    <session>.pstats    这一次运行的 cProfile 数据，用 pstats 或 snakeviz 查看
+"""
+from __future__ import print_function, division
+import os
+import sys
+import time
+import atexit
+import cProfile
+import threading
+from collections import defaultdict
+from common import timing
+
+PROFILE_DIR = 'profiles'
+
+# 采样间隔，单位为秒
+SAMPLE_INTERVAL = 0.005
+
+
+def folded_stack(frame):
+    """
+    返回从最外层到 frame 的调用栈，每层为 "文件名:函数名"，用 ; 连接
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{}:{}'.format(os.path.basename(code.co_filename),
+                                    code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profiler(object):
+    """
+    every 为每隔几帧采样一帧，duration 为采样的总时间（秒），None 为不限；
+    主循环每一帧开始时调用 next_frame
+    """
+
+    def __init__(self, directory=PROFILE_DIR, every=1, duration=None,
+                 interval=SAMPLE_INTERVAL):
+        self.directory = directory
+        self.every = max(every, 1)
+        self.duration = duration
+        self.interval = interval
+        self.session = time.strftime('%Y%m%d-%H%M%S')
+        self.samples = defaultdict(int)
+        self.frames = 0
+        self.profiled_frames = 0
+        self.sampling = False
+        self.started = None
+        self._profile = cProfile.Profile()
+        self._target = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        """
+        在主线程中调用，开始后台采样线程；打开 timing 以便按阶段标注
+        """
+        timing.enable()
+        self._target = threading.current_thread().ident
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._sample)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def next_frame(self):
+        """
+        结束上一帧的采样，决定这一帧是否采样；超过 duration 时写入结果
+        """
+        self._stop_frame()
+        if self.duration is not None \
+                and time.time() - self.started >= self.duration:
+            self.close()
+            return
+        if self._closed:
+            return
+        if self.frames % self.every == 0:
+            self.profiled_frames += 1
+            self._profile.enable()
+            self.sampling = True
+        self.frames += 1
+
+    def _stop_frame(self):
+        if self.sampling:
+            self.sampling = False
+            self._profile.disable()
+
+    def _sample(self):
+        while not self._stopped.wait(self.interval):
+            if not self.sampling:
+                continue
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stages = timing.current_stages(self._target)
+            stage = '/'.join(stages) if stages else 'other'
+            self.samples['{};{}'.format(stage, folded_stack(frame))] += 1
+
+    def close(self):
+        """
+        停止采样，写入折叠的调用栈和 cProfile 数据
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._stop_frame()
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        prefix = os.path.join(self.directory, self.session)
+        with open(prefix + '.folded', 'w') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write('{} {}\n'.format(stack, count))
+        self._profile.dump_stats(prefix + '.pstats')
+        print('profile: {} 帧中采样 {} 帧，{} 个样本，已写入 {}.folded 和 '
+              '{}.pstats'.format(self.frames, self.profiled_frames,
+                                sum(self.samples.values()), prefix, prefix))
@@ -3,36 +3,259 @@
 手机屏幕截图的代码
 """
 import subprocess
+import struct
 import os
+import re
 import sys
+from io import BytesIO
+import numpy as np
 from PIL import Image
+from common import timing
+from common.adb import adb_command
+from common.frame import Frame
 
 
-# SCREENSHOT_WAY 是截图方法，经过 check_screenshot 后，会自动递减，不需手动修改
-SCREENSHOT_WAY = 3
+# SCREENSHOT_WAY 是截图方法，经过 check_screenshot 后，会自动递减，不需手动修改，
+# 检查的结果缓存在设备信息中，见 common/device.py
+SCREENSHOT_WAY = 5
+
+# screencap 不加 -p 时输出的像素格式，1 为 RGBA_8888，2 为 RGBX_8888
+RAW_PIXEL_FORMATS = (1, 2)
+# 原始数据头依次为宽、高、像素格式，Android 9 之后还多一个色彩空间
+RAW_HEADER_SIZES = (12, 16)
+# 方式 5 只传输识别需要的行，2/3 屏幕高度以下多传输的行数，
+# 需要覆盖到新块右顶点的扫描范围
+STRIP_MARGIN = 200
+# 识别时把截图缩放到的宽度，None 为不缩放，见 Frame.scaled
+CANONICAL_WIDTH = None
+# 为 True 时方式 5 也获取完整的截图，debug 备份的截图才有分数和新块上方的
+# 画面，见 use_full_frame
+FULL_FRAME = False
+
+
+def decode_png_screenshot(binary_screenshot):
+    """
+    在内存中解码 PNG 数据，返回 Frame
+    """
+    with timing.span('decode'):
+        im = Image.open(BytesIO(binary_screenshot))
+        if im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGB')
+        return Frame(np.asarray(im), image=im, encoded=binary_screenshot)
+
+
+def parse_raw_screenshot(binary_screenshot):
+    """
+    解析 screencap 的原始数据，返回 (h, w, 4) 的 uint8 数组，
+    数组直接引用 binary_screenshot 的内存，不做复制
+    """
+    width, height, pixel_format = struct.unpack_from(
+        '<III', binary_screenshot)
+    pixels_size = width * height * 4
+    header_size = len(binary_screenshot) - pixels_size
+    if not pixels_size or header_size not in RAW_HEADER_SIZES \
+            or pixel_format not in RAW_PIXEL_FORMATS:
+        raise ValueError('无法解析的截图数据')
+    return np.frombuffer(
+        binary_screenshot, dtype=np.uint8, count=pixels_size,
+        offset=header_size).reshape(height, width, 4)
+
+
+def strip_rows(h, margin=STRIP_MARGIN):
+    """
+    识别需要的行范围 [y_start, y_end)，棋子和新块都在 h/3 到 2h/3 之间，
+    上面多留出 scan_start_y 的一个步长和用来比较的上一行
+    """
+    return max(int(h / 3) - 21, 0), min(int(h * 2 / 3) + 1 + margin, h)
+
+
+class Screenshot(object):
+    """
+    一台设备的截图方法，serial 为空时使用默认设备；way 即 SCREENSHOT_WAY，
+    经过 check 后会自动递减；full_frame 为 True 时方式 5 也获取完整的截图
+    """
+
+    def __init__(self, serial=None, way=5, raw_layout=None,
+                 canonical_width=None, full_frame=False):
+        self.serial = serial
+        self.way = way
+        self.canonical_width = canonical_width
+        self.full_frame = full_frame
+        # 最近一次原始帧数据的 (宽, 高, 数据头长度)，方式 5 据此计算要截取的字节
+        self.raw_layout = raw_layout
+
+    def _adb(self, args):
+        return adb_command(args, self.serial)
+
+    @property
+    def local_png(self):
+        """
+        方式 0 pull 到电脑上的文件名，多台设备时各用各的
+        """
+        if self.serial:
+            return 'autojump_{}.png'.format(re.sub(r'\W', '_', self.serial))
+        return 'autojump.png'
+
+    def pull_png_screenshot(self):
+        """
+        获取 PNG 格式的屏幕截图数据，目前有 0 1 2 3 四种方法，方式 4 5 见
+        pull_raw_screenshot 和 pull_raw_strip，未来添加新的平台监测方法时，
+        可根据效率及适用性由高到低排序
+        """
+        if 1 <= self.way <= 3:
+            with timing.span('transfer'):
+                process = subprocess.Popen(
+                    self._adb('shell screencap -p'),
+                    shell=True, stdout=subprocess.PIPE)
+                binary_screenshot = process.stdout.read()
+            if self.way == 2:
+                binary_screenshot = binary_screenshot.replace(
+                    b'\r\n', b'\n')
+            elif self.way == 1:
+                binary_screenshot = binary_screenshot.replace(
+                    b'\r\r\n', b'\n')
+            return binary_screenshot
+        # 方式 0 只能先存在手机上再 pull 下来
+        with timing.span('transfer'):
+            os.system(self._adb('shell screencap -p /sdcard/autojump.png'))
+            os.system(self._adb('pull /sdcard/autojump.png {}'.format(
+                self.local_png)))
+            with open(self.local_png, 'rb') as f:
+                return f.read()
+
+    def pull_raw_screenshot(self):
+        """
+        通过 exec-out 读取原始的帧数据，省去手机上的 PNG 编码、电脑上的解码，
+        也不用写入 autojump.png
+        """
+        with timing.span('transfer'):
+            process = subprocess.Popen(
+                self._adb('exec-out screencap'),
+                shell=True, stdout=subprocess.PIPE)
+            binary_screenshot = process.stdout.read()
+            process.wait()
+        with timing.span('decode'):
+            im_array = parse_raw_screenshot(binary_screenshot)
+        height, width = im_array.shape[:2]
+        self.raw_layout = (width, height,
+                           len(binary_screenshot) - im_array.nbytes)
+        return im_array
+
+    def pull_raw_strip(self, y_start, y_end):
+        """
+        只传输原始帧数据中 [y_start, y_end) 的行，在手机上用 tail 跳过前面的行、
+        用 head 截断后面的行，返回 (y_end - y_start, w, 4) 的 uint8 数组
+        """
+        width, height, header_size = self.raw_layout
+        row_size = width * 4
+        offset = header_size + y_start * row_size
+        size = (y_end - y_start) * row_size
+        with timing.span('transfer'):
+            process = subprocess.Popen(
+                self._adb('exec-out "screencap | tail -c +{} | head -c {}"'
+                          .format(offset + 1, size)),
+                shell=True, stdout=subprocess.PIPE)
+            binary_strip = process.stdout.read(size)
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        if len(binary_strip) != size:
+            raise ValueError('截取的数据长度不正确')
+        return np.frombuffer(binary_strip, dtype=np.uint8).reshape(
+            y_end - y_start, width, 4)
+
+    def pull_frame(self, margin=STRIP_MARGIN):
+        """
+        获取屏幕截图并返回 Frame，整个过程不写入 autojump.png（方式 0 除外），
+        方式 5 只获取识别需要的那一段（full_frame 时除外），Frame.y_offset
+        为这一段第一行的 y 坐标；
+        设置了 canonical_width 时返回缩放后的一帧
+        """
+        with timing.span('capture'):
+            return self._pull_frame(margin)
+
+    def _pull_frame(self, margin):
+        if self.way == 5 and not self.full_frame:
+            width, height = self.raw_layout[:2]
+            y_start, y_end = self._strip_rows(width, height, margin)
+            frame = Frame(self.pull_raw_strip(y_start, y_end), y_start,
+                          (width, height))
+        elif self.way >= 4:
+            frame = Frame(self.pull_raw_screenshot())
+        else:
+            frame = decode_png_screenshot(self.pull_png_screenshot())
+        if self.canonical_width and self.canonical_width != frame.size[0]:
+            return frame.scaled(self.canonical_width)
+        return frame
+
+    def _strip_rows(self, width, height, margin):
+        """
+        缩放识别时识别需要的行在缩放后的坐标中，换算回原图中的行
+        """
+        if not self.canonical_width:
+            return strip_rows(height, margin)
+        scale = self.canonical_width / float(width)
+        y_start, y_end = strip_rows(int(round(height * scale)),
+                                    int(margin * scale) + 1)
+        return (int(y_start / scale),
+                min(int((y_end - 1) / scale) + 1, height))
+
+    def check(self):
+        """
+        检查获取截图的方式
+        """
+        while True:
+            if self.way < 0:
+                print('暂不支持当前设备')
+                sys.exit()
+            try:
+                if self.way == 5:
+                    height = self.pull_raw_screenshot().shape[0]
+                    self.pull_raw_strip(*strip_rows(height))
+                elif self.way == 4:
+                    self.pull_raw_screenshot()
+                else:
+                    decode_png_screenshot(self.pull_png_screenshot())
+                print('采用方式 {} 获取截图'.format(self.way))
+                return
+            except Exception:
+                self.way -= 1
+
+
+# 默认设备使用的截图方法，以下函数都通过它获取截图
+_default_screenshot = Screenshot(way=SCREENSHOT_WAY)
+
+
+def _default():
+    _default_screenshot.way = SCREENSHOT_WAY
+    _default_screenshot.canonical_width = CANONICAL_WIDTH
+    _default_screenshot.full_frame = FULL_FRAME
+    return _default_screenshot
+
+
+def pull_png_screenshot():
+    return _default().pull_png_screenshot()
 
 
 def pull_screenshot():
     """
-    获取屏幕截图，目前有 0 1 2 3 四种方法，未来添加新的平台监测方法时，
-    可根据效率及适用性由高到低排序
+    获取屏幕截图并写入 autojump.png
     """
-    global SCREENSHOT_WAY
-    if 1 <= SCREENSHOT_WAY <= 3:
-        process = subprocess.Popen(
-            'adb shell screencap -p',
-            shell=True, stdout=subprocess.PIPE)
-        binary_screenshot = process.stdout.read()
-        if SCREENSHOT_WAY == 2:
-            binary_screenshot = binary_screenshot.replace(b'\r\n', b'\n')
-        elif SCREENSHOT_WAY == 1:
-            binary_screenshot = binary_screenshot.replace(b'\r\r\n', b'\n')
-        f = open('autojump.png', 'wb')
+    binary_screenshot = pull_png_screenshot()
+    with open('autojump.png', 'wb') as f:
         f.write(binary_screenshot)
-        f.close()
-    elif SCREENSHOT_WAY == 0:
-        os.system('adb shell screencap -p /sdcard/autojump.png')
-        os.system('adb pull /sdcard/autojump.png .')
+
+
+def pull_raw_screenshot():
+    return _default().pull_raw_screenshot()
+
+
+def pull_raw_strip(y_start, y_end):
+    return _default().pull_raw_strip(y_start, y_end)
+
+
+def pull_frame(margin=STRIP_MARGIN):
+    return _default().pull_frame(margin)
 
 
 def check_screenshot():
@@ -40,18 +263,36 @@ def check_screenshot():
     检查获取截图的方式
     """
     global SCREENSHOT_WAY
-    if os.path.isfile('autojump.png'):
-        try:
-            os.remove('autojump.png')
-        except Exception:
-            pass
-    if SCREENSHOT_WAY < 0:
-        print('暂不支持当前设备')
-        sys.exit()
-    pull_screenshot()
-    try:
-        Image.open('./autojump.png').load()
-        print('采用方式 {} 获取截图'.format(SCREENSHOT_WAY))
-    except Exception:
-        SCREENSHOT_WAY -= 1
-        check_screenshot()
+    _default().check()
+    SCREENSHOT_WAY = _default_screenshot.way
+
+
+def use_profile(profile):
+    """
+    使用设备信息中缓存的截图方式，代替 check_screenshot
+    """
+    global SCREENSHOT_WAY
+    SCREENSHOT_WAY = profile['screenshot_way']
+    _default_screenshot.raw_layout = profile['raw_layout']
+    print('采用方式 {} 获取截图'.format(SCREENSHOT_WAY))
+
+
+def use_canonical_width(width):
+    """
+    之后获取的截图都缩放到 width 宽再识别，None 为不缩放
+    """
+    global CANONICAL_WIDTH
+    CANONICAL_WIDTH = width
+    if width:
+        print('截图缩放到 {} 宽后识别'.format(width))
+
+
+def use_full_frame(enabled):
+    """
+    enabled 为 True 时方式 5 也获取完整的截图：打开 debug 时备份的截图和
+    标注用的截图有整个屏幕，便于排查，代价是每帧传输的数据约为原来的三倍
+    """
+    global FULL_FRAME
+    FULL_FRAME = enabled
+    if enabled and SCREENSHOT_WAY == 5:
+        print('debug 时获取完整的截图')
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+落稳检测的代码，按压之后不再固定等待，而是不断截图，每次都是完整的
+截图（方式 5 为识别需要的那一段），只在比较时隔行隔列抽样；
+棋子和加分动画都停下来之后立即返回
+"""
+from __future__ import division
+import time
+import random
+import numpy as np
+from common import timing
+
+
+def probe_array(frame, step):
+    """
+    将一帧按 step 隔行隔列抽样，得到用来比较的探测帧
+    """
+    return frame.array[::step, ::step, :3].astype(np.int16)
+
+
+def probe_diff(probe, last_probe, pixel_threshold=30):
+    """
+    两个探测帧中变化了的点数，三个通道差的绝对值之和大于 pixel_threshold
+    的点算变化了；不用整帧的平均差，棋子移动几个像素、加分的数字这样
+    小块的变化平均到整帧上都很小
+    """
+    if probe.shape != last_probe.shape:
+        return probe.shape[0] * probe.shape[1]
+    return int(np.count_nonzero(
+        np.abs(probe - last_probe).sum(axis=2) > pixel_threshold))
+
+
+class SettleDetector(object):
+    """
+    按压结束后先随机等待 jitter 区间内的时间（防 ban），然后不断截图，
+    连续 stable_probes 次与上一帧相比变化了的点数（见 probe_diff）都不超过
+    max_changed 时认为已落稳；开始截图之后最长再等 timeout 秒，
+    所以预计的落稳时间再长也会比较几帧
+    """
+
+    def __init__(self, jitter=(0.3, 0.5), timeout=2.0, pixel_threshold=30,
+                 max_changed=0, stable_probes=2, step=4):
+        self.jitter = jitter
+        self.timeout = timeout
+        self.pixel_threshold = pixel_threshold
+        self.max_changed = max_changed
+        self.stable_probes = stable_probes
+        self.step = step
+        # 最近一次等待的时间和探测帧数，是否超时
+        self.elapsed = 0
+        self.probes = 0
+        self.timed_out = False
+        # 最近一次从按压结束到画面不再变化的时间，即稳定的第一帧开始截图的时间
+        self.settled_after = 0
+
+    def wait(self, grab, delay=0):
+        """
+        grab 用于获取一帧截图，返回落稳之后的那一帧，可以直接用于下一次识别
+        delay 为预计的落稳时间，在此之前不截图，但不会短于 jitter 的随机时间
+        """
+        start = time.time()
+        with timing.span('sleep'):
+            time.sleep(max(random.uniform(*self.jitter), delay))
+        stable_since = time.time() - start
+        # 超时从开始截图算起，预计的落稳时间超过 timeout 时也不会只截一帧
+        probe_start = time.time()
+        frame = grab()
+        last_probe = probe_array(frame, self.step)
+        self.probes = 1
+        stable = 0
+        while True:
+            self.timed_out = time.time() - probe_start >= self.timeout
+            if self.timed_out:
+                break
+            grabbed_at = time.time() - start
+            next_frame = grab()
+            probe = probe_array(next_frame, self.step)
+            self.probes += 1
+            frame.close()
+            frame = next_frame
+            if probe_diff(probe, last_probe,
+                          self.pixel_threshold) <= self.max_changed:
+                stable += 1
+                if stable >= self.stable_probes:
+                    break
+            else:
+                stable = 0
+                stable_since = grabbed_at
+            last_probe = probe
+        self.elapsed = time.time() - start
+        self.settled_after = self.elapsed if self.timed_out else stable_since
+        return frame
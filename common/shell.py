@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+长期保持的 adb shell 会话，按压等命令通过它的 stdin 发送，
+省去每次 os.system 新建 shell 和 adb 连接的开销
+"""
+import time
+import threading
+import subprocess
+from six.moves import queue
+
+# 等待命令输出结束标记的时间，单位为秒，超时后断开重连
+READ_TIMEOUT = 5.0
+
+
+class AdbShell(object):
+    """
+    每条命令后面追加 echo 结束标记，读到标记时认为命令已执行完；
+    输出由后台线程读取，timeout 秒内没有读到标记或管道断开时断开重连；
+    popen 可替换为假的进程用于测试，见 tests/test_shell.py
+    """
+
+    def __init__(self, command='adb shell', popen=subprocess.Popen,
+                 timeout=READ_TIMEOUT):
+        self.command = command
+        self._popen = popen
+        self.timeout = timeout
+        self.process = None
+        self.reconnects = 0
+        self._seq = 0
+        self._lines = None
+
+    def _connect(self):
+        self.process = self._popen(
+            self.command, shell=True,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # 每个连接一个队列，断开后旧连接剩下的输出不会读到新连接中
+        self._lines = queue.Queue()
+        reader = threading.Thread(target=self._read_lines,
+                                  args=(self.process.stdout, self._lines))
+        reader.daemon = True
+        reader.start()
+
+    @staticmethod
+    def _read_lines(stdout, lines):
+        # 在后台线程中读取，读到 EOF 时放入 None
+        try:
+            for line in iter(stdout.readline, b''):
+                lines.put(line)
+        except (IOError, OSError, ValueError):
+            pass
+        lines.put(None)
+
+    def _disconnect(self):
+        if self.process is None:
+            return
+        try:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.wait()
+        except OSError:
+            pass
+        self.process = None
+        self.reconnects += 1
+
+    def run(self, cmd, timeout=None):
+        """
+        执行 cmd 并返回它的输出；命令发送前管道已断开时重连后再发送一次，
+        发送之后才断开或 timeout（默认为 self.timeout）秒内没有执行完时
+        不再重发（命令可能已经执行），断开后返回 None
+        """
+        for attempt in range(2):
+            if self.process is None or self.process.poll() is not None:
+                self._connect()
+            self._seq += 1
+            marker = '__jump_done_{}__'.format(self._seq)
+            try:
+                self.process.stdin.write(
+                    '{}; echo {}\n'.format(cmd, marker).encode('utf-8'))
+                self.process.stdin.flush()
+            except (IOError, OSError):
+                self._disconnect()
+                continue
+            try:
+                return self._read_until(marker, timeout or self.timeout)
+            except (IOError, OSError, EOFError) as ex:
+                print('adb shell 已断开: {}'.format(ex))
+                self._disconnect()
+                return None
+        raise IOError('无法连接 adb shell')
+
+    def _read_until(self, marker, timeout):
+        output = []
+        deadline = time.time() + timeout
+        while True:
+            try:
+                line = self._lines.get(
+                    timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                raise IOError('{} 秒内没有读到结束标记'.format(timeout))
+            if line is None:
+                raise EOFError('没有读到结束标记')
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if line == marker:
+                return '\n'.join(output)
+            output.append(line)
+
+    def swipe(self, x1, y1, x2, y2, duration):
+        """
+        按压 duration 毫秒，命令执行完（即按压结束）后返回
+        """
+        return self.run('input swipe {} {} {} {} {}'.format(
+            x1, y1, x2, y2, duration), self.timeout + duration / 1000.0)
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            try:
+                self.process.stdin.write(b'exit\n')
+                self.process.stdin.flush()
+            except (IOError, OSError):
+                pass
+            self.process.wait()
+        self.process = None
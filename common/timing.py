@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+主循环各阶段的耗时统计，打开后用 span(stage) 计时：
+
+    with timing.span('press'):
+        ...
+
+关闭时 span 返回同一个什么都不做的对象，几乎没有开销。每个阶段保留最近
+window 次的耗时用来算百分位数，同时累计 Prometheus 直方图的各个桶，
+可以用 summary 输出一行摘要，用 export 写成 JSON 或 Prometheus 文本格式
+（node_exporter 的 textfile collector 可以直接读取）
+
+阶段名：
+    capture     获取一帧截图的全部时间，包括 transfer 和 decode
+    transfer    从手机读取截图数据
+    decode      解码 PNG 或原始帧数据
+    locate      识别一帧的全部时间，包括下面三个阶段
+    scan_start  探测 scan_start_y
+    piece       找棋子
+    board       找新块
+    press       发送按压命令
+    debug       提交 debug 截图和写标注
+    sleep       按压之后等待落稳的 sleep
+"""
+from __future__ import division
+import os
+import json
+import time
+import threading
+from collections import deque
+import numpy as np
+
+STAGES = ('capture', 'transfer', 'decode', 'locate', 'scan_start', 'piece',
+          'board', 'press', 'debug', 'sleep')
+
+# 直方图的桶的上界，单位为秒
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+           2.5)
+
+METRIC_NAME = 'wechat_jump_stage_seconds'
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    __slots__ = ('timing', 'stage', 'started', 'stages')
+
+    def __init__(self, timing, stage):
+        self.timing = timing
+        self.stage = stage
+
+    def __enter__(self):
+        self.stages = self.timing.active_stages()
+        self.stages.append(self.stage)
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timing.record(self.stage, time.time() - self.started)
+        self.stages.pop()
+        return False
+
+
+class StageStats(object):
+    """
+    一个阶段的统计：recent 为最近的耗时，count、total 和 buckets 为累计值
+    """
+
+    def __init__(self, window):
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def add(self, seconds):
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def percentile(self, p):
+        return float(np.percentile(self.recent, p)) if self.recent else 0.0
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, n in zip(BUCKETS, self.buckets):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        buckets['+Inf'] = self.count
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'p50': round(self.percentile(50), 6),
+            'p95': round(self.percentile(95), 6),
+            'p99': round(self.percentile(99), 6),
+            'max': round(max(self.recent), 6) if self.recent else 0.0,
+            'buckets': buckets,
+        }
+
+
+class Timing(object):
+    """
+    各阶段的耗时统计，可以在多个线程中使用
+    """
+
+    def __init__(self, enabled=False, window=100):
+        self.enabled = enabled
+        self.window = window
+        self.stages = {}
+        # 线程 -> 正在计时的阶段，从外到内
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def span(self, stage):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage)
+
+    def active_stages(self, ident=None):
+        """
+        线程 ident（默认为当前线程）正在计时的阶段列表，从外到内
+        """
+        if ident is None:
+            ident = threading.current_thread().ident
+        stages = self._active.get(ident)
+        if stages is None:
+            stages = self._active.setdefault(ident, [])
+        return stages
+
+    def record(self, stage, seconds):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats(self.window)
+            stats.add(seconds)
+
+    def _ordered(self):
+        # STAGES 中的阶段在前，其他阶段按名字排列
+        return sorted(self.stages.items(), key=lambda item: (
+            STAGES.index(item[0]) if item[0] in STAGES else len(STAGES),
+            item[0]))
+
+    def summary(self):
+        """
+        一行摘要，每个阶段为最近 window 次的 p50/p95，单位为毫秒
+        """
+        with self._lock:
+            return ' '.join('{} {:.0f}/{:.0f}ms'.format(
+                stage, stats.percentile(50) * 1000,
+                stats.percentile(95) * 1000)
+                for stage, stats in self._ordered())
+
+    def to_dict(self):
+        with self._lock:
+            return dict((stage, stats.to_dict())
+                        for stage, stats in self._ordered())
+
+    def to_prometheus(self):
+        """
+        Prometheus 文本格式的直方图，每个阶段一个 stage 标签
+        """
+        lines = ['# HELP {} 主循环各阶段的耗时'.format(METRIC_NAME),
+                 '# TYPE {} histogram'.format(METRIC_NAME)]
+        for stage, stats in sorted(self.to_dict().items()):
+            for bound in [str(b) for b in BUCKETS] + ['+Inf']:
+                lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(
+                    METRIC_NAME, stage, bound, stats['buckets'][bound]))
+            lines.append('{}_sum{{stage="{}"}} {}'.format(
+                METRIC_NAME, stage, stats['sum']))
+            lines.append('{}_count{{stage="{}"}} {}'.format(
+                METRIC_NAME, stage, stats['count']))
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path):
+        """
+        写入 path，.json 结尾时为 JSON，否则为 Prometheus 文本格式；
+        先写临时文件再改名，读取的一方不会读到写了一半的文件
+        """
+        if path.endswith('.json'):
+            content = json.dumps(self.to_dict(), indent=2, sort_keys=True)
+        else:
+            content = self.to_prometheus()
+        temp = '{}.tmp'.format(path)
+        with open(temp, 'w') as f:
+            f.write(content)
+        try:
+            os.replace(temp, path)
+        except AttributeError:
+            # Python 2 没有 os.replace，Windows 上 rename 不能覆盖
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp, path)
+
+
+# 各模块共用的统计，默认关闭
+_default_timing = Timing()
+
+
+def enable(window=100):
+    _default_timing.window = window
+    _default_timing.enabled = True
+
+
+def span(stage):
+    return _default_timing.span(stage)
+
+
+def current_stages(ident):
+    """
+    线程 ident 正在计时的阶段，供其他线程读取
+    """
+    return tuple(_default_timing.active_stages(ident))
+
+
+def summary():
+    return _default_timing.summary()
+
+
+def export(path):
+    _default_timing.export(path)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+测试用的合成截图：渐变背景上画当前块、棋子和新块
+"""
+import numpy as np
+
+WIDTH, HEIGHT = 540, 960
+
+
+def make_frame(rng, channels=4, width=WIDTH, height=HEIGHT):
+    """
+    位置和颜色由 rng（np.random.RandomState）随机决定
+    """
+    im = np.zeros((height, width, channels), np.uint8)
+    if channels == 4:
+        im[..., 3] = 255
+    top = rng.randint(150, 250, 3)
+    bottom = top - rng.randint(0, 60)
+    ratio = np.linspace(0, 1, height)[:, np.newaxis]
+    im[..., :3] = (top + (bottom - top) * ratio)[:, np.newaxis, :] \
+        .astype(np.uint8)
+    piece_x = rng.randint(100, width - 100)
+    piece_y = rng.randint(int(height * 0.45), int(height * 0.62))
+    im[piece_y - 5:piece_y + 20, piece_x - 75:piece_x + 75, :3] = \
+        rng.randint(0, 256, 3)
+    im[piece_y - 100:piece_y, piece_x - 17:piece_x + 17, :3] = (55, 58, 100)
+    board_x = rng.randint(60, width - 60)
+    board_y = piece_y - rng.randint(80, 200)
+    color = rng.randint(0, 256, 3)
+    for k in range(60):
+        half = int(min(k, 60 - k) * 1.7)
+        im[board_y + k, max(0, board_x - half):board_x + half + 1, :3] = \
+            color
+    return im
+
+
+def next_frame(rng, im):
+    """
+    在上一帧上做下一帧：不变、改一小块或者换一个新画面
+    """
+    choice = rng.randint(4)
+    if choice == 0:
+        return im.copy()
+    if choice == 3:
+        return make_frame(rng, im.shape[2], im.shape[1], im.shape[0])
+    im = im.copy()
+    height, width = im.shape[:2]
+    x, y = rng.randint(0, width - 40), rng.randint(0, height - 40)
+    size = rng.randint(1, 40)
+    im[y:y + size, x:x + size, :3] = rng.randint(0, 256, 3)
+    return im
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+common/annotation.py 的编号和标注记录，一秒内跳两次时截图和标注都不能重复
+
+    python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from common import annotation, debug
+from common.frame import Frame
+
+
+class FrozenClock(object):
+    """
+    代替 time 模块，时间停在同一毫秒
+    """
+
+    def time(self):
+        return 1515000000.123
+
+
+def make_frame():
+    array = np.zeros((64, 32, 4), np.uint8)
+    array[..., 3] = 255
+    return Frame(array)
+
+
+class AnnotationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self._time = annotation.time
+        self._backup_dir = debug.screenshot_backup_dir
+        annotation.time = FrozenClock()
+        debug.screenshot_backup_dir = self.directory + os.sep
+
+    def tearDown(self):
+        annotation.time = self._time
+        debug.screenshot_backup_dir = self._backup_dir
+        shutil.rmtree(self.directory)
+
+    def test_next_id_is_unique_within_a_millisecond(self):
+        first = annotation.next_id()
+        second = annotation.next_id()
+        self.assertGreaterEqual(first, 1515000000123)
+        self.assertEqual(second, first + 1)
+
+    def test_two_jumps_in_the_same_second(self):
+        log = annotation.AnnotationLog(self.directory, 'fake', 'fake-0')
+        ids = []
+        for piece_x in (10, 20):
+            ts = annotation.next_id()
+            ids.append(str(ts))
+            frame = make_frame()
+            log.add(ts, frame, piece_x, 40, 5, 10, 300)
+            debug.archive_frame(ts, frame, piece_x, 40, 5, 10)
+            log.landed(True)
+        records = annotation.load_annotations(log.path)
+        self.assertEqual(sorted(records), ids)
+        self.assertEqual([records[ts]['piece_x'] for ts in ids], [10, 20])
+        for ts in ids:
+            self.assertTrue(os.path.isfile(
+                os.path.join(self.directory, '{}.png'.format(ts))))
+            self.assertTrue(os.path.isfile(
+                os.path.join(self.directory, '{}_d.png'.format(ts))))
+
+    def test_corrections_merge_into_their_record(self):
+        log = annotation.AnnotationLog(self.directory)
+        first, second = annotation.next_id(), annotation.next_id()
+        log.add(first, make_frame(), 10, 40, 5, 10, 300)
+        log.add(second, make_frame(), 20, 40, 5, 10, 300)
+        log.close()
+        annotation.correct(log.path, first, board_x=7)
+        records = annotation.load_annotations(log.path)
+        self.assertEqual(records[str(first)]['board_x'], 7)
+        self.assertEqual(records[str(second)]['board_x'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+common/debug.py 中 DebugWriter 丢弃任务时的处理
+
+    python -m unittest discover tests
+"""
+import threading
+import unittest
+from common import debug
+
+
+class FakeFrame(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class DebugWriterTest(unittest.TestCase):
+
+    def run_writer(self, overflow):
+        release = threading.Event()
+        started = threading.Event()
+        written = []
+
+        def archive(ts, frame):
+            started.set()
+            release.wait()
+            written.append(ts)
+            frame.close()
+
+        writer = debug.DebugWriter(max_pending=1, overflow=overflow,
+                                   on_drop=debug.discard_frame)
+        frames = [FakeFrame() for _ in range(4)]
+        # 第一个任务在后台线程中卡住，第二个占满队列，后面的要丢弃
+        writer.submit(archive, 0, frames[0])
+        started.wait()
+        for ts, frame in enumerate(frames[1:], 1):
+            writer.submit(archive, ts, frame)
+        release.set()
+        writer.close()
+        return writer, frames, written
+
+    def test_drop_oldest_closes_dropped_frames(self):
+        writer, frames, written = self.run_writer('drop_oldest')
+        self.assertEqual(written, [0, 3])
+        self.assertEqual(writer.dropped, 2)
+        self.assertTrue(all(frame.closed for frame in frames))
+
+    def test_drop_newest_closes_dropped_frames(self):
+        writer, frames, written = self.run_writer('drop_newest')
+        self.assertEqual(written, [0, 1])
+        self.assertEqual(writer.dropped, 2)
+        self.assertTrue(all(frame.closed for frame in frames))
+
+    def test_submit_after_close_closes_frame(self):
+        writer = debug.DebugWriter(on_drop=debug.discard_frame)
+        writer.close()
+        frame = FakeFrame()
+        self.assertFalse(writer.submit(debug.archive_frame, 0, frame))
+        self.assertTrue(frame.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
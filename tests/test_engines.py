@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+在合成截图和截取的一段上并排运行 numpy 引擎和逐像素扫描的 reference 引擎，
+检查两者的 Location 完全相同
+
+    python -m unittest discover tests
+"""
+import unittest
+import numpy as np
+from PIL import Image
+from common import detector
+from common.detector import scan
+from common.frame import Frame
+from synthetic import HEIGHT, make_frame, next_frame
+
+CONFIG = {
+    'piece_body_width': 70,
+    'piece_body_height_1_2': 20,
+    'board_right_scan_height': 120,
+}
+
+FIELDS = ('scan_start_y', 'piece_bottom', 'board_top', 'board_right_y')
+
+
+def make_strip(im, y_offset):
+    """
+    整张截图 im 中从第 y_offset 行开始的一段，与截图方式 5 得到的一帧相同
+    """
+    height, width = im.shape[:2]
+    return Frame(im[y_offset:], y_offset=y_offset, size=(width, height))
+
+
+class EngineEquivalenceTest(unittest.TestCase):
+
+    def check_sequence(self, seed, channels=4, y_offset=0, frames=6):
+        rules = scan.compile_rules({})
+        numpy_engine = detector.create_engine('numpy', CONFIG, rules=rules)
+        reference = detector.create_engine('reference', CONFIG, rules=rules)
+        rng = np.random.RandomState(seed)
+        im = make_frame(rng, channels)
+        found = 0
+        for i in range(frames):
+            if y_offset:
+                frame = make_strip(im, y_offset)
+            else:
+                mode = 'RGBA' if channels == 4 else 'RGB'
+                frame = Frame(im, image=Image.fromarray(im, mode))
+            expected = reference.locate(frame)
+            actual = numpy_engine.locate(frame)
+            for field in FIELDS:
+                self.assertEqual(getattr(actual, field),
+                                 getattr(expected, field),
+                                 'seed {}, frame {}: {}'.format(seed, i,
+                                                                field))
+            found += expected.board_top is not None
+            im = next_frame(rng, im)
+        return found
+
+    def test_rgba_frames(self):
+        found = sum(self.check_sequence(seed) for seed in range(10))
+        self.assertGreater(found, 0)
+
+    def test_rgb_frames(self):
+        found = sum(self.check_sequence(seed, channels=3)
+                    for seed in range(10, 15))
+        self.assertGreater(found, 0)
+
+    def test_strips(self):
+        found = sum(self.check_sequence(seed, y_offset=HEIGHT // 4)
+                    for seed in range(15, 20))
+        self.assertGreater(found, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+在合成的连续帧上并排运行 scan.find_board_top 和 IncrementalBoardScan，
+检查增量扫描的结果与全图扫描完全相同
+
+    python -m unittest discover tests
+"""
+import unittest
+import numpy as np
+from common.detector import scan
+from synthetic import WIDTH, HEIGHT, make_frame, next_frame
+
+
+class IncrementalBoardScanTest(unittest.TestCase):
+
+    def check_sequence(self, seed, channels=4, y_offset=0, frames=30):
+        rng = np.random.RandomState(seed)
+        incremental = scan.IncrementalBoardScan()
+        im = make_frame(rng, channels)
+        for _ in range(frames):
+            im = next_frame(rng, im)
+            strip = im[y_offset:]
+            x_start = rng.randint(0, WIDTH // 4)
+            x_end = rng.randint(WIDTH * 3 // 4, WIDTH + 1)
+            y_start = rng.randint(y_offset, HEIGHT // 2)
+            y_end = rng.randint(y_start + 1, HEIGHT + 1)
+            expected = scan.find_board_top(strip, x_start, x_end, y_start,
+                                           y_end, y_offset, threshold=10)
+            actual = incremental.find_board_top(strip, x_start, x_end,
+                                                y_start, y_end, y_offset,
+                                                threshold=10)
+            self.assertEqual(actual, expected,
+                             'seed {}: ({}, {}, {}, {})'.format(
+                                 seed, x_start, x_end, y_start, y_end))
+        return incremental
+
+    def test_rgba_frames(self):
+        for seed in range(10):
+            incremental = self.check_sequence(seed)
+        self.assertGreater(incremental.reused_tiles, 0)
+
+    def test_rgb_frames(self):
+        for seed in range(5):
+            self.check_sequence(seed, channels=3)
+
+    def test_strips(self):
+        for seed in range(5):
+            self.check_sequence(seed, y_offset=HEIGHT // 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+ios 引擎加上 iOS 的坐标规则，结果与 wechat_jump_auto_iOS.py 原来逐个像素
+扫描的 find_piece_and_board 相同
+
+    python -m unittest discover tests
+"""
+from __future__ import division
+import math
+import unittest
+import numpy as np
+from PIL import Image
+from common import detector
+from common.detector import scan
+from common.frame import Frame
+from synthetic import make_frame
+
+CONFIG = {
+    'under_game_score_y': 100,
+    'piece_base_height_1_2': 12,
+    'piece_body_width': 35,
+    'piece_body_height_1_2': 40,
+}
+
+
+def baseline_find_piece_and_board(im, under_game_score_y,
+                                  piece_base_height_1_2, piece_body_width):
+    """
+    wechat_jump_auto_iOS.py 原来的 find_piece_and_board，只把配置改成参数
+    """
+    w, h = im.size
+    piece_x_sum = piece_x_c = piece_y_max = 0
+    board_x = board_y = 0
+    scan_x_border = int(w / 8)
+    scan_start_y = 0
+    im_pixel = im.load()
+    for i in range(under_game_score_y, h, 50):
+        last_pixel = im_pixel[0, i]
+        for j in range(1, w):
+            pixel = im_pixel[j, i]
+            if pixel != last_pixel:
+                scan_start_y = i - 50
+                break
+        if scan_start_y:
+            break
+    for i in range(scan_start_y, int(h * 2 / 3)):
+        for j in range(scan_x_border, w - scan_x_border):
+            pixel = im_pixel[j, i]
+            if (50 < pixel[0] < 60) \
+                    and (53 < pixel[1] < 63) \
+                    and (95 < pixel[2] < 110):
+                piece_x_sum += j
+                piece_x_c += 1
+                piece_y_max = max(i, piece_y_max)
+    if not all((piece_x_sum, piece_x_c)):
+        return 0, 0, 0, 0
+    piece_x = piece_x_sum / piece_x_c
+    piece_y = piece_y_max - piece_base_height_1_2
+    for i in range(int(h / 3), int(h * 2 / 3)):
+        last_pixel = im_pixel[0, i]
+        if board_x or board_y:
+            break
+        board_x_sum = 0
+        board_x_c = 0
+        for j in range(w):
+            pixel = im_pixel[j, i]
+            if abs(j - piece_x) < piece_body_width:
+                continue
+            if abs(pixel[0] - last_pixel[0]) \
+                    + abs(pixel[1] - last_pixel[1]) \
+                    + abs(pixel[2] - last_pixel[2]) > 10:
+                board_x_sum += j
+                board_x_c += 1
+        if board_x_sum:
+            board_x = board_x_sum / board_x_c
+    board_y = piece_y - abs(board_x - piece_x) * math.sqrt(3) / 3
+    if not all((board_x, board_y)):
+        return 0, 0, 0, 0
+    return piece_x, piece_y, board_x, board_y
+
+
+class IosEngineTest(unittest.TestCase):
+
+    def check_frames(self, channels, seeds):
+        engine = detector.create_engine(
+            'ios', CONFIG, rules=scan.compile_rules({}),
+            **detector.rule_options('iOS', CONFIG))
+        for seed in seeds:
+            im_array = make_frame(np.random.RandomState(seed), channels)
+            im = Image.fromarray(im_array, 'RGBA' if channels == 4 else 'RGB')
+            expected = baseline_find_piece_and_board(
+                im, CONFIG['under_game_score_y'],
+                CONFIG['piece_base_height_1_2'], CONFIG['piece_body_width'])
+            location = engine.locate(Frame(im_array, image=im))
+            actual = detector.jump_points(location, CONFIG, 'iOS')
+            self.assertNotEqual(expected, (0, 0, 0, 0))
+            for a, b in zip(actual, expected):
+                self.assertAlmostEqual(a, b, places=6,
+                                       msg='seed {}: {} != {}'.format(
+                                           seed, actual, expected))
+
+    def test_rgba_frames(self):
+        self.check_frames(4, range(6))
+
+    def test_rgb_frames(self):
+        self.check_frames(3, range(6, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+比较 scan.find_board_top_pyramid 和全图扫描 scan.find_board_top：合成截图上
+结果相同；顶点只落在缩小图跳过的列中时找到的是更靠下的一行
+
+    python -m unittest discover tests
+"""
+import unittest
+import numpy as np
+from common.detector import scan
+from synthetic import WIDTH, HEIGHT, make_frame
+
+FACTORS = (2, 4, 8)
+
+
+def draw_board(im, board_x, board_y, color):
+    """
+    与 synthetic.make_frame 相同的新块，顶点宽 1 列
+    """
+    for k in range(60):
+        half = int(min(k, 60 - k) * 1.7)
+        im[board_y + k, board_x - half:board_x + half + 1, :3] = color
+
+
+class PyramidBoardScanTest(unittest.TestCase):
+
+    def check_frames(self, seeds, channels=4, y_offset=0):
+        for seed in seeds:
+            im = make_frame(np.random.RandomState(seed), channels)
+            strip = im[y_offset:]
+            y_start, y_end = max(HEIGHT // 3, y_offset), HEIGHT * 2 // 3
+            expected = scan.find_board_top(strip, 0, WIDTH, y_start, y_end,
+                                           y_offset, threshold=10)
+            self.assertIsNotNone(expected)
+            for factor in FACTORS:
+                actual = scan.find_board_top_pyramid(
+                    strip, 0, WIDTH, y_start, y_end, y_offset, threshold=10,
+                    factor=factor)
+                self.assertEqual(actual, expected,
+                                 'seed {}, factor {}'.format(seed, factor))
+
+    def test_rgba_frames(self):
+        self.check_frames(range(20))
+
+    def test_rgb_frames(self):
+        self.check_frames(range(20, 30), channels=3)
+
+    def test_strips(self):
+        self.check_frames(range(30, 40), y_offset=HEIGHT // 4)
+
+    def test_thin_spike_in_skipped_columns(self):
+        factor = 4
+        board_x, board_y = 270, 400
+        im = np.zeros((HEIGHT, WIDTH, 4), np.uint8)
+        im[..., :3] = 200
+        im[..., 3] = 255
+        draw_board(im, board_x, board_y, (80, 120, 160))
+        without_spike = im.copy()
+        # 顶点上方 3 * factor 行宽 1 列的尖角，所在的列缩小图不取样
+        spike_x = board_x + 1
+        self.assertNotEqual(spike_x % factor, 0)
+        im[board_y - 3 * factor:board_y, spike_x, :3] = (80, 120, 160)
+        args = (0, WIDTH, HEIGHT // 3, HEIGHT * 2 // 3, 0)
+        self.assertEqual(scan.find_board_top(im, *args, threshold=10),
+                         (spike_x, board_y - 3 * factor))
+        # 窗口在尖角下方，找到的是没有尖角时的顶点所在的行
+        _, y = scan.find_board_top_pyramid(im, *args, threshold=10,
+                                           factor=factor)
+        self.assertEqual(y, board_y)
+        self.assertEqual(
+            scan.find_board_top(without_spike, *args, threshold=10),
+            (board_x, board_y))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+用假的时钟和截图测试 common/settle.py 的 SettleDetector
+
+    python -m unittest discover tests
+"""
+import unittest
+import numpy as np
+from common import settle
+
+
+class FakeClock(object):
+    """
+    代替 time 模块，sleep 只把时间往后拨
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeFrame(object):
+
+    def __init__(self, array):
+        self.array = array
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeScreen(object):
+    """
+    每次截图花 interval 秒；截图完成时还没到 moving_until（从按压结束
+    算起）的帧中棋子都在移动，之后不动
+    """
+
+    def __init__(self, clock, moving_until, interval=0.1):
+        self.clock = clock
+        self.start = clock.now
+        self.moving_until = moving_until
+        self.interval = interval
+        self.frames = []
+
+    def grab(self):
+        self.clock.now += self.interval
+        array = np.zeros((64, 64, 4), np.uint8)
+        if self.clock.now - self.start < self.moving_until:
+            x = len(self.frames) * 4 % 48
+            array[20:40, x:x + 16, :3] = 255
+        frame = FakeFrame(array)
+        self.frames.append(frame)
+        return frame
+
+
+class SettleDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self._time = settle.time
+        settle.time = self.clock
+
+    def tearDown(self):
+        settle.time = self._time
+
+    def test_settles_after_movement_stops(self):
+        screen = FakeScreen(self.clock, moving_until=1.0)
+        detector = settle.SettleDetector(jitter=(0, 0), timeout=2.0)
+        frame = detector.wait(screen.grab, 0.5)
+        self.assertFalse(detector.timed_out)
+        self.assertIs(frame, screen.frames[-1])
+        self.assertAlmostEqual(detector.settled_after, 0.9, places=6)
+        self.assertTrue(all(f.closed for f in screen.frames[:-1]))
+
+    def test_long_delay_still_checks_frames(self):
+        # 预计的落稳时间超过 timeout 时，仍要截图比较直到画面不动
+        screen = FakeScreen(self.clock, moving_until=2.8)
+        detector = settle.SettleDetector(jitter=(0, 0), timeout=2.0)
+        detector.wait(screen.grab, 2.5)
+        self.assertFalse(detector.timed_out)
+        self.assertGreater(detector.probes, 2)
+        self.assertAlmostEqual(detector.settled_after, 2.7, places=6)
+
+    def test_times_out_counting_from_first_grab(self):
+        screen = FakeScreen(self.clock, moving_until=100)
+        detector = settle.SettleDetector(jitter=(0, 0), timeout=2.0)
+        detector.wait(screen.grab, 2.5)
+        self.assertTrue(detector.timed_out)
+        self.assertAlmostEqual(detector.elapsed, 4.5, places=6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+用假的 adb shell 进程测试 common/shell.py 的 AdbShell，不需要连接手机
+
+    python -m unittest discover tests
+"""
+import unittest
+from six.moves import queue
+from common import shell
+
+
+class _FakeStdin(object):
+
+    def __init__(self, process):
+        self._process = process
+
+    def write(self, data):
+        if self._process.returncode is not None:
+            raise IOError('Broken pipe')
+        for line in data.decode('utf-8').splitlines():
+            self._process.execute(line)
+
+    def flush(self):
+        pass
+
+
+class _FakeStdout(object):
+
+    def __init__(self, process):
+        self._process = process
+
+    def readline(self):
+        # 和管道一样没有输出时阻塞，进程结束后返回 b''
+        return self._process.output.get()
+
+
+class FakeShellProcess(object):
+    """
+    代替 adb shell 进程：记录收到的命令，echo 命令输出对应的内容，其余命令
+    没有输出；kill_after 条命令后模拟管道断开，hang_after 条命令后不再有
+    任何输出，模拟卡住的 adb
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.commands = []
+        self.output = queue.Queue()
+        self.returncode = None
+        self.kill_after = kwargs.pop('kill_after', None)
+        self.hang_after = kwargs.pop('hang_after', None)
+        self.stdin = _FakeStdin(self)
+        self.stdout = _FakeStdout(self)
+
+    def execute(self, line):
+        if self.hang_after is not None \
+                and len(self.commands) >= self.hang_after:
+            return
+        for cmd in line.split(';'):
+            cmd = cmd.strip()
+            if cmd == 'exit':
+                self._exit(0)
+            elif cmd.startswith('echo '):
+                self.output.put(cmd[5:].encode('utf-8') + b'\n')
+            elif cmd:
+                self.commands.append(cmd)
+                if self.kill_after is not None \
+                        and len(self.commands) >= self.kill_after:
+                    self._exit(-9)
+                    return
+
+    def _exit(self, returncode):
+        if self.returncode is None:
+            self.returncode = returncode
+            self.output.put(b'')
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self._exit(-9)
+
+    def wait(self):
+        return self.returncode
+
+
+class FakePopen(object):
+    """
+    代替 subprocess.Popen，每次连接创建一个 FakeShellProcess，
+    options 为每个进程的参数，依次使用，用完后使用默认参数
+    """
+
+    def __init__(self, *options):
+        self.options = list(options)
+        self.processes = []
+
+    def __call__(self, *args, **kwargs):
+        options = self.options.pop(0) if self.options else {}
+        process = FakeShellProcess(**options)
+        self.processes.append(process)
+        return process
+
+
+class AdbShellTest(unittest.TestCase):
+
+    def test_run_returns_output(self):
+        popen = FakePopen()
+        adb_shell = shell.AdbShell(popen=popen)
+        self.assertEqual(adb_shell.run('echo hello'), 'hello')
+        self.assertEqual(adb_shell.run('input tap 1 2'), '')
+        self.assertEqual(len(popen.processes), 1)
+        self.assertEqual(popen.processes[0].commands, ['input tap 1 2'])
+        self.assertEqual(adb_shell.reconnects, 0)
+
+    def test_reconnects_after_broken_pipe(self):
+        popen = FakePopen({'kill_after': 2})
+        adb_shell = shell.AdbShell(popen=popen)
+        adb_shell.swipe(1, 2, 1, 2, 300)
+        # 第二条命令执行后管道断开，不重发，返回 None
+        self.assertIsNone(adb_shell.swipe(3, 4, 3, 4, 300))
+        self.assertEqual(adb_shell.reconnects, 1)
+        # 下一条命令在新的连接上执行
+        adb_shell.swipe(5, 6, 5, 6, 300)
+        self.assertEqual(len(popen.processes), 2)
+        self.assertEqual(popen.processes[0].commands,
+                         ['input swipe 1 2 1 2 300',
+                          'input swipe 3 4 3 4 300'])
+        self.assertEqual(popen.processes[1].commands,
+                         ['input swipe 5 6 5 6 300'])
+
+    def test_resends_when_pipe_broke_before_sending(self):
+        popen = FakePopen()
+        adb_shell = shell.AdbShell(popen=popen)
+        adb_shell.run('input tap 1 2')
+
+        def broken_pipe(data):
+            raise IOError('Broken pipe')
+        # 进程看起来还在，写入时才发现管道已断开，重连后再发送一次
+        popen.processes[0].stdin.write = broken_pipe
+        self.assertEqual(adb_shell.run('echo again'), 'again')
+        self.assertEqual(len(popen.processes), 2)
+        self.assertEqual(adb_shell.reconnects, 1)
+
+    def test_reconnects_after_timeout(self):
+        popen = FakePopen({'hang_after': 1})
+        adb_shell = shell.AdbShell(popen=popen, timeout=0.1)
+        adb_shell.run('input tap 1 2')
+        self.assertIsNone(adb_shell.run('input tap 3 4'))
+        self.assertEqual(adb_shell.reconnects, 1)
+        self.assertEqual(popen.processes[0].returncode, -9)
+        self.assertEqual(adb_shell.run('echo ok'), 'ok')
+        self.assertEqual(len(popen.processes), 2)
+
+    def test_close_exits_shell(self):
+        popen = FakePopen()
+        adb_shell = shell.AdbShell(popen=popen)
+        adb_shell.run('input tap 1 2')
+        adb_shell.close()
+        self.assertEqual(popen.processes[0].returncode, 0)
+        self.assertIsNone(adb_shell.process)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,25 +6,19 @@ import datetime
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import cv2
+from common import config, detector
+from common.frame import Frame
 
 scale = 0.25
 
-template = cv2.imread('character.png')
-template = cv2.resize(template, (0, 0), fx=scale, fy=scale)
-template_size = template.shape[:2]
-
-
-def search(img):
-    result = cv2.matchTemplate(img, template, cv2.TM_SQDIFF)
-    min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(result)
-
-    cv2.rectangle(
-        img,
-        (min_loc[0], min_loc[1]),
-        (min_loc[0] + template_size[1], min_loc[1] + template_size[0]),
-        (255, 0, 0),
-        4)
-    return img, min_loc[0] + template_size[1] / 2, min_loc[1] +  template_size[0]
+config = config.open_accordant_config()
+detector.use_config(config)
+# 识别引擎由配置文件中的 detector_engine 选择，见 common/detector；
+# 选 template 时用 character.png 作为棋子的模板
+engine = detector.create_engine(config.get('detector_engine'), config,
+                                template='character.png',
+                                template_scale=scale)
+src_x = src_y = 0
 
 
 def pull_screenshot():
@@ -45,9 +39,13 @@ def jump(distance):
 def update_data():
     global src_x, src_y
 
-    img = cv2.imread('autojump.png')
+    img = cv2.cvtColor(cv2.imread('autojump.png'), cv2.COLOR_BGR2RGB)
+    location = engine.locate(Frame(img))
+    if location.piece_bottom is not None:
+        src_x = location.piece_bottom[0] * scale
+        src_y = location.piece_bottom[1] * scale
     img = cv2.resize(img, (0, 0), fx=scale, fy=scale)
-    img, src_x, src_y = search(img)
+    cv2.circle(img, (int(src_x), int(src_y)), 10, (255, 0, 0), 4)
     return img
 
 
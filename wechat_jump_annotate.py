@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+查看和修正 debug 时记录的标注，标注格式见 common/annotation.py
+
+    python wechat_jump_annotate.py list [--failed]
+    python wechat_jump_annotate.py fix ts [--piece x y] [--board x y]
+                                          [--landed yes|no]
+
+fix 不指定 --piece 和 --board 时打开截图，依次点击棋子和目标点；
+修正只会追加到标注文件中，不修改原来的记录
+"""
+from __future__ import print_function, division
+import os
+import sys
+import argparse
+try:
+    from common import annotation, debug
+except Exception as ex:
+    print(ex)
+    print('请将脚本放在项目根目录中运行')
+    print('请检查项目根目录中的 common 文件夹是否存在')
+    exit(-1)
+
+
+VERSION = "1.0.0"
+
+
+def list_annotations(annotations, failed=False):
+    for ts in sorted(annotations):
+        record = annotations[ts]
+        if failed and record.get('landed') is not False:
+            continue
+        print('{} {} piece ({}, {}) board ({}, {}) press {}ms landed {}{}'
+              .format(ts, record.get('resolution'), record['piece_x'],
+                      record['piece_y'], record['board_x'], record['board_y'],
+                      record.get('press_time'), record.get('landed'),
+                      ' (修正过)' if record.get('corrected') else ''))
+
+
+def click_points(path, record):
+    """
+    显示截图，返回依次点击的棋子和目标点的坐标
+    """
+    import matplotlib.pyplot as plt
+    from PIL import Image
+    fig = plt.figure()
+    plt.imshow(Image.open(path))
+    plt.plot([record['piece_x'], record['board_x']],
+             [record['piece_y'], record['board_y']], 'r-o')
+    plt.title('依次点击棋子和目标点')
+    points = plt.ginput(2, timeout=0)
+    plt.close(fig)
+    if len(points) < 2:
+        return None
+    return [int(round(v)) for point in points for v in point]
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='查看和修正标注')
+    parser.add_argument('-d', '--directory',
+                        default=debug.screenshot_backup_dir,
+                        help='截图备份目录')
+    commands = parser.add_subparsers(dest='command')
+    list_parser = commands.add_parser('list', help='列出标注')
+    list_parser.add_argument('--failed', action='store_true',
+                             help='只列出没有落稳的')
+    fix_parser = commands.add_parser('fix', help='修正一帧的标注')
+    fix_parser.add_argument('ts')
+    fix_parser.add_argument('--piece', type=int, nargs=2,
+                            metavar=('X', 'Y'))
+    fix_parser.add_argument('--board', type=int, nargs=2,
+                            metavar=('X', 'Y'))
+    fix_parser.add_argument('--landed', choices=('yes', 'no'))
+    args = parser.parse_args()
+
+    print('程序版本号：{}'.format(VERSION))
+    path = os.path.join(args.directory, annotation.ANNOTATION_FILE)
+    annotations = annotation.load_annotations(path)
+    if args.command == 'list':
+        list_annotations(annotations, args.failed)
+        return 0
+    if args.command != 'fix':
+        parser.print_help()
+        return 1
+
+    record = annotations.get(args.ts)
+    if record is None:
+        print('{} 中没有 {} 的标注'.format(path, args.ts))
+        return 1
+    fields = {}
+    if args.piece is None and args.board is None and args.landed is None:
+        points = click_points(
+            os.path.join(args.directory, '{}.png'.format(args.ts)), record)
+        if points is None:
+            print('没有修改')
+            return 1
+        args.piece, args.board = points[:2], points[2:]
+    if args.piece is not None:
+        fields['piece_x'], fields['piece_y'] = args.piece
+    if args.board is not None:
+        fields['board_x'], fields['board_y'] = args.board
+    if args.landed is not None:
+        fields['landed'] = args.landed == 'yes'
+    annotation.correct(path, record['ts'], **fields)
+    list_annotations({args.ts: annotation.load_annotations(path)[args.ts]})
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,26 +17,20 @@
 """
 import os
 import shutil
-import time
 import math
-import random
 import json
 from PIL import Image, ImageDraw
 import wda
+from common import detector, settle, flight, annotation
+from common.frame import Frame
 
 
 with open('config.json', 'r') as f:
     config = json.load(f)
 
 
-# Magic Number，不设置可能无法正常执行，请根据具体截图从上到下按需设置
-under_game_score_y = config['under_game_score_y']
 # 长按的时间系数，请自己根据实际情况调节
 press_coefficient = config['press_coefficient']
-# 二分之一的棋子底座高度，可能要调节
-piece_base_height_1_2 = config['piece_base_height_1_2']
-# 棋子的宽度，比截图中量到的稍微大一点比较安全，可能要调节
-piece_body_width = config['piece_body_width']
 time_coefficient = config['press_coefficient']
 
 # 模拟按压的起始点坐标，需要自动重复游戏请设置成“再来一局”的坐标
@@ -50,6 +44,19 @@ swipe = config.get('swipe', {
 c = wda.Client()
 s = c.session()
 
+# 棋子颜色和棋盘边缘色差阈值，config.json 中没有时使用默认值
+detector.use_config(config)
+
+# 识别引擎由 config.json 中的 detector_engine 选择，见 common/detector；
+# 默认为 ios 引擎，与原来的扫描方式相同。选其他引擎时新块扫描到棋子最低
+# 一行往上棋子底盘高度的一半为止
+engine = detector.create_engine(config.get('detector_engine', 'ios'), config,
+                                **detector.rule_options('iOS', config))
+# 检测棋子是否落稳，代替固定的等待时间，按压后先随机等待的时间区间防 ban
+settle_detector = settle.SettleDetector(jitter=(0.3, 0.4), timeout=2.0)
+# 根据按压时间（毫秒）预测落稳时间，到时间再开始截图，样本记录在文件中
+flight_model = flight.FlightModel('flight_samples.jsonl')
+
 screenshot_backup_dir = 'screenshot_backups/'
 if not os.path.isdir(screenshot_backup_dir):
     os.mkdir(screenshot_backup_dir)
@@ -59,10 +66,20 @@ def pull_screenshot():
     c.screenshot('1.png')
 
 
+def pull_probe_frame():
+    """
+    截图并返回用于落稳检测的 Frame，最后一次截图留在 1.png 中
+    """
+    pull_screenshot()
+    im = Image.open('./1.png')
+    return Frame(detector.image_to_array(im), image=im)
+
+
 def jump(distance):
     press_time = distance * time_coefficient / 1000
     print('press time: {}'.format(press_time))
     s.tap_hold(200, 200, press_time)
+    return press_time
 
 
 def backup_screenshot(ts):
@@ -108,101 +125,50 @@ def find_piece_and_board(im):
 
     print("size: {}, {}".format(w, h))
 
-    piece_x_sum = piece_x_c = piece_y_max = 0
-    board_x = board_y = 0
-    scan_x_border = int(w / 8)  # 扫描棋子时的左右边界
-    scan_start_y = 0  # 扫描的起始 y 坐标
-    im_pixel = im.load()
-
-    # 以 50px 步长，尝试探测 scan_start_y
-    for i in range(under_game_score_y, h, 50):
-        last_pixel = im_pixel[0, i]
-        for j in range(1, w):
-            pixel = im_pixel[j, i]
-
-            # 不是纯色的线，则记录scan_start_y的值，准备跳出循环
-            if pixel != last_pixel:
-                scan_start_y = i - 50
-                break
-
-        if scan_start_y:
-            break
-
-    print("scan_start_y: ", scan_start_y)
-
-    # 从 scan_start_y 开始往下扫描，棋子应位于屏幕上半部分，这里暂定不超过 2/3
-    for i in range(scan_start_y, int(h * 2 / 3)):
-        # 横坐标方面也减少了一部分扫描开销
-        for j in range(scan_x_border, w - scan_x_border):
-            pixel = im_pixel[j, i]
-            # 根据棋子的最低行的颜色判断，找最后一行那些点的平均值，这个颜
-            # 色这样应该 OK，暂时不提出来
-            if (50 < pixel[0] < 60) \
-                    and (53 < pixel[1] < 63) \
-                    and (95 < pixel[2] < 110):
-                piece_x_sum += j
-                piece_x_c += 1
-                piece_y_max = max(i, piece_y_max)
-
-    if not all((piece_x_sum, piece_x_c)):
-        return 0, 0, 0, 0
-    piece_x = piece_x_sum / piece_x_c
-    piece_y = piece_y_max - piece_base_height_1_2  # 上移棋子底盘高度的一半
-
-    for i in range(int(h / 3), int(h * 2 / 3)):
-        last_pixel = im_pixel[0, i]
-        if board_x or board_y:
-            break
-        board_x_sum = 0
-        board_x_c = 0
-
-        for j in range(w):
-            pixel = im_pixel[j, i]
-            # 修掉脑袋比下一个小格子还高的情况的 bug
-            if abs(j - piece_x) < piece_body_width:
-                continue
-
-            # 修掉圆顶的时候一条线导致的小 bug，这个颜色判断应该 OK，暂时不提出来
-            if abs(pixel[0] - last_pixel[0]) \
-                    + abs(pixel[1] - last_pixel[1]) \
-                    + abs(pixel[2] - last_pixel[2]) > 10:
-                board_x_sum += j
-                board_x_c += 1
-
-        if board_x_sum:
-            board_x = board_x_sum / board_x_c
-
-    # 按实际的角度来算，找到接近下一个 board 中心的坐标 这里的角度应该
-    # 是 30°,值应该是 tan 30°, math.sqrt(3) / 3
-    board_y = piece_y - abs(board_x - piece_x) * math.sqrt(3) / 3
-
-    if not all((board_x, board_y)):
-        return 0, 0, 0, 0
-
-    return piece_x, piece_y, board_x, board_y
+    location = engine.locate(Frame(detector.image_to_array(im), image=im))
+    print("scan_start_y: ", location.scan_start_y)
+    # 棋子上移底盘高度的一半，新块按实际的角度 30° 从棋子推算，
+    # 见 detector.RULES 中的 iOS
+    return detector.jump_points(location, config, 'iOS')
 
 
 def main():
+    # 每一跳的坐标、按压时间和是否落稳追加到备份目录的标注文件中
+    annotation_log = annotation.AnnotationLog(screenshot_backup_dir, 'iOS',
+                                              rule='iOS')
+    pull_screenshot()
     while True:
-        pull_screenshot()
         im = Image.open("./1.png")
 
         # 获取棋子和 board 的位置
         piece_x, piece_y, board_x, board_y = find_piece_and_board(im)
-        ts = int(time.time())
+        # 每一跳的编号，同时是备份截图的文件名和标注的 ts
+        ts = annotation.next_id()
         print(ts, piece_x, piece_y, board_x, board_y)
+        # 上一跳之后还能找到棋子，就是落稳了
+        annotation_log.landed(piece_x != 0)
         if piece_x == 0:
             return
 
         set_button_position(im)
         distance = math.sqrt(
             (board_x - piece_x) ** 2 + (board_y - piece_y) ** 2)
-        jump(distance)
+        press_time = jump(distance) * 1000
 
         save_debug_creenshot(ts, im, piece_x, piece_y, board_x, board_y)
         backup_screenshot(ts)
-        # 为了保证截图的时候应落稳了，多延迟一会儿，随机值防 ban
-        time.sleep(random.uniform(1, 1.1))
+        annotation_log.add(ts, Frame(detector.image_to_array(im), image=im),
+                           piece_x, piece_y, board_x, board_y, press_time)
+        # 到预计的落稳时间再开始截图，等到棋子和加分动画都停下来，
+        # 落稳后的截图留在 1.png 中
+        predicted = flight_model.predict(press_time)
+        settle_detector.wait(pull_probe_frame,
+                             flight_model.deadline(press_time)).close()
+        if not settle_detector.timed_out:
+            flight_model.update(press_time, settle_detector.settled_after)
+        print('settle: {:.2f}s, predicted: {:.2f}s, mean error: {:.2f}s'
+              .format(settle_detector.settled_after, predicted,
+                      flight_model.mean_abs_error()))
 
 
 if __name__ == '__main__':
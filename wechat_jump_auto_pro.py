@@ -1,15 +1,13 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import print_function, division
-import os
-import sys
-import time
 import math
 import random
-from PIL import Image
+import argparse
 from six.moves import input
 try:
-    from common import debug, config, screenshot
+    from common import debug, config, screenshot, detector, settle, flight
+    from common import shell, device, annotation, timing, profiler
 except Exception as ex:
     print(ex)
     print('请将脚本放在项目根目录中运行')
@@ -21,20 +19,66 @@ VERSION = "1.1.1"
 
 # DEBUG 开关，需要调试的时候请改为 True，不需要调试的时候为 False
 DEBUG_SWITCH = True
-
-
-# Magic Number，不设置可能无法正常执行，请根据具体截图从上到下按需设置，设置保存在 config 文件夹中
-config = config.open_accordant_config()
-under_game_score_y = config['under_game_score_y']
+# debug 截图在后台保存，最多积压的数量，以及积压满了之后的处理方式：
+# drop_oldest 丢弃最早的，drop_newest 丢弃最新的，block 等待保存完成
+DEBUG_MAX_PENDING = 4
+DEBUG_OVERFLOW = 'drop_oldest'
+# 打开 debug 时截图方式 5 也获取完整的截图，备份的截图有分数和新块上方的
+# 画面；为 False 时只备份识别用的那一段（标注中的 y_offset 为它的位置），
+# 传输更少但不便排查
+DEBUG_FULL_FRAME = True
+# 落稳检测：按压后先随机等待的时间区间（秒，随机值防 ban），最长等待时间
+SETTLE_JITTER = (0.3, 0.5)
+SETTLE_TIMEOUT = 2.0
+# 记录按压时间和落稳时间的样本文件，用来学习下一次截图的时间
+FLIGHT_SAMPLES_FILE = 'flight_samples.jsonl'
+# 识别前把截图缩放到的宽度，如 720，识别耗时与手机分辨率无关，
+# 配置参数也换算到这个宽度；None 为按原分辨率识别
+CANONICAL_WIDTH = None
+# 先在 1/PYRAMID_FACTOR 的缩小图上找棋子和新块的大致位置，再在原分辨率的
+# 几行中精确查找，如 4；None 为全图扫描。打开 debug 时同时做一次全图扫描，
+# 输出两种方式的耗时和坐标差
+PYRAMID_FACTOR = None
+# 与上一帧比较，只对有变化的格子重新做新块顶点的扫描，结果与全图扫描相同；
+# PYRAMID_FACTOR 不为 None 时不使用
+INCREMENTAL_SCAN = False
+# 跨帧跟踪棋子：先在上一跳预计的落点附近的窗口中找棋子，找不到或棋子可能
+# 不完整时再全图扫描。窗口外有颜色相近的像素时结果可能与全图扫描不同，
+# 见 detector.PieceTracker，默认关闭
+TRACK_PIECE = False
+# 统计主循环各阶段的耗时，每 TIMING_REPORT_INTERVAL 跳输出一次摘要；
+# TIMING_EXPORT_FILE 不为 None 时同时写入该文件，.json 结尾为 JSON 格式，
+# 否则为 Prometheus 文本格式，见 common/timing.py
+TIMING_SWITCH = False
+TIMING_REPORT_INTERVAL = 10
+TIMING_EXPORT_FILE = None
+
+
+# 设备信息缓存在 device_profiles.json 中，再次启动时不用重新检测
+device_profile = device.load_profile()
+# 按型号或屏幕大小选择配置，像素参数按屏幕宽度换算，见 common/config.py
+config = config.load_config(device_profile['config_file'],
+                            device_profile['screen_size'], CANONICAL_WIDTH)
 # 长按的时间系数，请自己根据实际情况调节
 press_coefficient = config['press_coefficient']
-# 二分之一的棋子底座高度，可能要调节
-piece_base_height_1_2 = config['piece_base_height_1_2']
-# 棋子的宽度，比截图中量到的稍微大一点比较安全，可能要调节
-piece_body_width = config['piece_body_width']
-piece_body_height_1_2 = config['piece_body_height_1_2']
-sinA = config['sinA']
-tanA = config['tanA']
+
+# 棋子颜色和棋盘边缘色差阈值，启动时编译成查找表，换皮肤时只需修改配置
+detector.use_config(config)
+
+# 识别引擎由配置文件中的 detector_engine 选择，见 common/detector；
+# PYRAMID_FACTOR、INCREMENTAL_SCAN 和 TRACK_PIECE 只对 numpy 引擎有效
+# 这里棋子的 Y 坐标就是最低一行，新块扫描到棋子最低一行为止
+engine = detector.create_engine(
+    config.get('detector_engine'), config, pyramid_factor=PYRAMID_FACTOR,
+    incremental=INCREMENTAL_SCAN, verify=DEBUG_SWITCH, track=TRACK_PIECE,
+    **detector.rule_options('pro', config))
+# 检测棋子是否落稳，代替固定的等待时间
+settle_detector = settle.SettleDetector(jitter=SETTLE_JITTER,
+                                        timeout=SETTLE_TIMEOUT)
+# 根据按压时间预测落稳时间，到时间再开始截图
+flight_model = flight.FlightModel(FLIGHT_SAMPLES_FILE)
+# 按压命令通过一直保持的 adb shell 发送
+input_shell = shell.AdbShell()
 
 
 def set_button_position(w, h):
@@ -56,7 +100,7 @@ def jump(distance):
     press_time = distance + press_coefficient
     press_time = max(press_time, 200)   # 设置 200ms 是最小的按压时间
     press_time = int(press_time)
-    cmd = 'adb shell input swipe {x1} {y1} {x2} {y2} {duration}'.format(
+    cmd = 'input swipe {x1} {y1} {x2} {y2} {duration}'.format(
         x1=swipe_x1,
         y1=swipe_y1,
         x2=swipe_x2,
@@ -64,119 +108,21 @@ def jump(distance):
         duration=press_time
     )
     print(cmd)
-    os.system(cmd)
+    # 通过一直保持的 adb shell 发送，命令执行完即按压结束；按压时间之外
+    # READ_TIMEOUT 秒还没有执行完时重连
+    input_shell.run(cmd, shell.READ_TIMEOUT + press_time / 1000)
     return press_time
 
 
-def find_scan_start_y(w, h, im_pixel):
-    scan_start_y = 0  # 扫描的起始 y 坐标
-
-    # 开始 定位 小人儿的坐标
-    # 以 50px 步长，尝试探测 scan_start_y （这个是  整个图像中的颜色发化的最高点）
-    for i in range(int(h / 3), int(h * 2 / 3), 20):
-        last_pixel = im_pixel[0, i]  # The background color;
-        for j in range(1, w):
-            # 不是纯色的线，则记录 scan_start_y 的值，准备跳出循环
-            if im_pixel[j, i] != last_pixel:
-                scan_start_y = i - 20
-                break
-        if scan_start_y:
-            break
-    print('scan_start_y: {}'.format(scan_start_y))
-    return scan_start_y
-
-
-def find_piece(w, h, im_pixel, scan_start_x, scan_start_y):
-    piece_x = 0  # 小人的X坐标
-    piece_y = 0  # 小人的Y坐标
-    piece_x_max = 0
-    piece_y_max = 0
-    piece_x_sum = 0
-    piece_x_c = 0
-
-    # 从 scan_start_y 开始往下扫描，棋子应位于屏幕上半部分，这里暂定不超过 2/3
-    for i in range(int(h * 2 / 3), scan_start_y, -1):  # 从上到下
-        # 横坐标方面也减少了一部分扫描开销
-        for j in range(scan_start_x, w - scan_start_x):  # 从左到右
-            pixel = im_pixel[j, i]
-            # 根据棋子的最低行的颜色判断，找最后一行那些点的平均值，这个颜
-            # 色这样应该 OK，暂时不提出来
-            if (50 < pixel[0] < 60) \
-                    and (53 < pixel[1] < 63) \
-                    and (95 < pixel[2] < 110):
-                piece_x_sum += j
-                piece_x_c += 1
-        if piece_x_c:
-            piece_y_max = i
-            piece_x = int(piece_x_sum / piece_x_c)
-            piece_y = piece_y_max
-            break
-
-    return piece_x, piece_y
-
-
-def find_board(w, h, im_pixel, piece_x, piece_y, scan_start_y):
-    board_x = 0  # 目标点的X坐标
-    board_y = 0  # 目标点的Y坐标
-    board_x_sum = 0
-    board_x_c = 0
-    board_y_sum = 0
-    board_y_c = 0
-    board_y_top = 0
-
-    # 缩小扫描范围，如果棋子在左侧，则从棋子向右扫描，反之相反
-    if piece_x < w / 2:
-        board_x_start = int(piece_x + piece_body_width / 2)
-        board_x_end = w - 1
-    else:
-        board_x_start = 0
-        board_x_end = int(piece_x - piece_body_width / 2)
-    # 只扫描到与棋子底部以上的部分
-    board_y_start = scan_start_y
-    board_y_end = piece_y
-
-    # 开始扫描  新目标块的 顶点X坐标
-    for i in range(board_y_start, board_y_end):  # 从上到下
-        for j in range(board_x_start, board_x_end):  # 从左到右
-            pixel = im_pixel[j, i]
-            last_pixel = im_pixel[j, i - 1]
-            # 修掉圆顶的时候一条线导致的小 bug，这个颜色判断应该 OK，暂时不提出来
-            if abs(pixel[0] - last_pixel[0]) \
-                    + abs(pixel[1] - last_pixel[1]) \
-                    + abs(pixel[2] - last_pixel[2]) > 10:
-                board_x_sum += j
-                board_x_c += 1
-        if board_x_c:
-            board_x = int(board_x_sum / board_x_c)
-            # 临时保存 新块顶点的 Y坐标
-            board_y_top = i
-            break
-
-    # 开始扫描   新增目标块右顶点 Y坐标（从上到下，从右到左）
-#     if board_x < piece_x:  # 如果新块在棋子的左侧，且棋子和新块非常近，则从棋子的左侧向扫描，否则从新块
-#         board_x_end = max(board_x + 200, int(piece_x - piece_body_width / 2))
-    if abs(board_x - piece_x) < 300:  # 如果新块和棋子太近，则取固定值
-        board_y = piece_y - abs((board_x - piece_x) * tanA)
-        return board_x, board_y
-
-    board_y_start = board_y_top
-    board_y_end = int(board_y_top + 187)
-
-    for i in range(board_x, w):  # 从右到左
-        board_y_temp = 0
-        for j in range(board_y_start, board_y_end):  # 从上到下，而且只扫描到 新块顶点向下180单位
-            pixel = im_pixel[i, j]
-            last_pixel = im_pixel[0, j]
-            # 比对当前点和该行的第一个点是否相同，如果不相同，则加和
-            if abs(pixel[0] - last_pixel[0]) \
-                + abs(pixel[1] - last_pixel[1]) \
-                    + abs(pixel[2] - last_pixel[2]) > 10:
-                board_y = board_y_temp = j
-            if board_y_temp:
-                break
-        if board_y_temp == 0:  # 如果上一次循环没有找到不同的颜色点
-            break
-    return board_x, board_y
+def find_piece_and_board(frame):
+    """
+    用识别引擎找棋子和新块，返回 (piece_x, piece_y, board_x, board_y)
+    """
+    location = engine.locate(frame)
+    print('scan_start_y: {}'.format(location.scan_start_y))
+    # 棋子的 Y 坐标就是最低一行，新块和棋子太近时按角度推算，
+    # 见 detector.RULES 中的 pro
+    return detector.jump_points(location, config, 'pro')
 
 
 def yes_or_no(prompt, true_value='y', false_value='n', default=True):
@@ -198,38 +144,95 @@ def yes_or_no(prompt, true_value='y', false_value='n', default=True):
         i = input(prompt)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', action='store_true',
+                        help='采样主循环的调用栈，结果写入 {}/'.format(
+                            profiler.PROFILE_DIR))
+    parser.add_argument('--profile-every', type=int, default=1,
+                        help='每隔几帧采样一帧')
+    parser.add_argument('--profile-duration', type=float,
+                        help='采样多少秒，默认直到程序结束')
+    return parser.parse_args()
+
+
 def main():
     """
     主函数
     """
+    args = parse_args()
 
     print('程序版本号：{}'.format(VERSION))
-    debug.dump_device_info()
-    screenshot.check_screenshot()
-
+    debug.dump_device_info(info=device_profile)
+    screenshot.use_profile(device_profile)
+    screenshot.use_canonical_width(CANONICAL_WIDTH)
+    screenshot.use_full_frame(DEBUG_SWITCH and DEBUG_FULL_FRAME)
+    if TIMING_SWITCH:
+        timing.enable()
+    if args.profile:
+        loop_profiler = profiler.Profiler(every=args.profile_every,
+                                          duration=args.profile_duration)
+        loop_profiler.start()
+    if DEBUG_SWITCH:
+        # 丢弃的保存任务也要关闭其中的截图
+        debug_writer = debug.DebugWriter(max_pending=DEBUG_MAX_PENDING,
+                                         overflow=DEBUG_OVERFLOW,
+                                         on_drop=debug.discard_frame)
+        # 每一跳的坐标、按压时间和是否落稳追加到备份目录的标注文件中
+        annotation_log = annotation.AnnotationLog(
+            debug.screenshot_backup_dir, device_profile['model'],
+            device_profile['serial'], rule='pro')
+
+    # 截图只在内存中传递，可能只是识别需要的那一段，
+    # y_offset 为这一段第一行的 y 坐标
+    frame = screenshot.pull_frame()
+    jumps = 0
     while True:
-        screenshot.pull_screenshot()
-        im = Image.open('./autojump.png')
-        w, h = im.size
-        im_pixel = im.load()
-        scan_start_x = int(w / 8)  # 扫描棋子时的左右边界
-        scan_start_y = find_scan_start_y(w, h, im_pixel)  # 扫描的起始 y 坐标
+        if args.profile:
+            loop_profiler.next_frame()
         # 获取棋子和 board 的位置
-        piece_x, piece_y = find_piece(
-            w, h, im_pixel, scan_start_x, scan_start_y)
-        board_x, board_y = find_board(
-            w, h, im_pixel, piece_x, piece_y, scan_start_y)
-        ts = int(time.time())
+        piece_x, piece_y, board_x, board_y = find_piece_and_board(frame)
+        if DEBUG_SWITCH:
+            # 上一跳之后还能找到棋子，就是落稳了
+            annotation_log.landed(piece_x != 0)
+        # 跳得准时棋子最低一行会落到这里，下一帧先在附近找棋子
+        engine.expect(board_x, board_y)
+        # 缩放识别时把坐标换算回手机屏幕上的坐标
+        piece_x, piece_y = frame.to_device(piece_x, piece_y)
+        board_x, board_y = frame.to_device(board_x, board_y)
+        # 每一跳的编号，同时是备份截图的文件名和标注的 ts
+        ts = annotation.next_id()
         print(ts, piece_x, piece_y, board_x, board_y)
-        set_button_position(w, h)
-        jump(math.sqrt((board_x - piece_x) ** 2 + (board_y - piece_y) ** 2))
+        set_button_position(*frame.device_size)
+        with timing.span('press'):
+            press_time = jump(math.sqrt(
+                (board_x - piece_x) ** 2 + (board_y - piece_y) ** 2))
+        if DEBUG_SWITCH:
+            with timing.span('debug'):
+                annotation_log.add(ts, frame, piece_x, piece_y, board_x,
+                                   board_y, press_time)
+                # 在后台保存，保存完后关闭 frame
+                debug_writer.submit(debug.archive_frame, ts, frame, piece_x,
+                                    piece_y, board_x, board_y)
+        else:
+            frame.close()
+        # 到预计的落稳时间再开始截图，等到棋子和加分动画都停下来，
+        # 落稳后的那一帧直接用于下一次识别
+        predicted = flight_model.predict(press_time)
+        frame = settle_detector.wait(screenshot.pull_frame,
+                                     flight_model.deadline(press_time))
+        if not settle_detector.timed_out:
+            flight_model.update(press_time, settle_detector.settled_after)
+        print('settle: {:.2f}s, predicted: {:.2f}s, mean error: {:.2f}s'
+              .format(settle_detector.settled_after, predicted,
+                      flight_model.mean_abs_error()))
         if DEBUG_SWITCH:
-            debug.save_debug_screenshot(ts, im, piece_x,
-                                        piece_y, board_x, board_y)
-            debug.backup_screenshot(ts)
-        im.close()
-        # 为了保证截图的时候应落稳了，多延迟一会儿，随机值防 ban
-        time.sleep(random.uniform(1.2, 1.6))
+            print(engine.report())
+        jumps += 1
+        if TIMING_SWITCH and jumps % TIMING_REPORT_INTERVAL == 0:
+            print(timing.summary())
+            if TIMING_EXPORT_FILE:
+                timing.export(TIMING_EXPORT_FILE)
 
 
 if __name__ == '__main__':
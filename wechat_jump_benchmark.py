@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+在录下的截图上离线评测识别引擎，不需要连接手机
+
+    python wechat_jump_benchmark.py [截图目录] [-e 引擎 ...] [-o 结果.json]
+                                    [--baseline 之前的结果.json]
+
+默认评测 screenshot_backups/ 中的截图和所有注册的引擎，标注格式见
+common/annotation.py；指定 --baseline 时与之前的结果比较，有退化时返回 1
+"""
+from __future__ import print_function, division
+import sys
+import json
+import argparse
+try:
+    from common import annotation, benchmark, debug, detector
+except Exception as ex:
+    print(ex)
+    print('请将脚本放在项目根目录中运行')
+    print('请检查项目根目录中的 common 文件夹是否存在')
+    exit(-1)
+
+
+VERSION = "1.0.0"
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description='离线评测识别引擎')
+    parser.add_argument('directory', nargs='?',
+                        default=debug.screenshot_backup_dir,
+                        help='截图目录')
+    parser.add_argument('-e', '--engine', action='append',
+                        choices=sorted(detector.ENGINES),
+                        help='要评测的引擎，可以指定多次，默认为全部')
+    parser.add_argument('-a', '--annotations',
+                        help='标注文件，默认为截图目录中的 {}'.format(
+                            annotation.ANNOTATION_FILE))
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='每张截图计时的次数')
+    parser.add_argument('-o', '--output', default='benchmark.json',
+                        help='JSON 格式的结果文件')
+    parser.add_argument('--template', default='character.png',
+                        help='template 引擎使用的棋子模板')
+    parser.add_argument('--pyramid-factor', type=int,
+                        help='numpy 引擎的金字塔缩小倍数')
+    parser.add_argument('--baseline', help='用来比较的之前的结果文件')
+    args = parser.parse_args()
+
+    print('程序版本号：{}'.format(VERSION))
+    results = benchmark.run(args.directory, args.engine, args.annotations,
+                            args.repeat, template=args.template,
+                            pyramid_factor=args.pyramid_factor, track=False)
+    print(benchmark.format_report(results))
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print('结果已写入 {}'.format(args.output))
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = benchmark.compare(results, json.load(f))
+        for regression in regressions:
+            print('退化: {}'.format(regression))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
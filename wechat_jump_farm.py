@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+多台手机同时运行，识别和按压的方式与 wechat_jump_auto.py 相同
+
+    python wechat_jump_farm.py [serial ...]
+
+不指定 serial 时使用所有已连接的设备，Ctrl-C 结束并输出每台设备的跳跃速度
+"""
+from __future__ import print_function, division
+import sys
+try:
+    from common import farm
+except Exception as ex:
+    print(ex)
+    print('请将脚本放在项目根目录中运行')
+    print('请检查项目根目录中的 common 文件夹是否存在')
+    exit(-1)
+
+
+VERSION = "1.1.1"
+
+# 每隔多少秒输出一次跳跃速度
+REPORT_INTERVAL = 30
+
+
+def main():
+    """
+    主函数
+    """
+    print('程序版本号：{}'.format(VERSION))
+    serials = sys.argv[1:] or None
+    farm.Farm(serials).run(report_interval=REPORT_INTERVAL)
+
+
+if __name__ == '__main__':
+    main()